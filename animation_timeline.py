@@ -0,0 +1,73 @@
+import numpy as np
+
+
+# Easing functions take and return NumPy arrays (or scalars) of progress in [0, 1]
+
+def linear(x):
+    return np.asarray(x, dtype=np.float64)
+
+
+def ease_in_out_expo(x):
+    x = np.asarray(x, dtype=np.float64)
+    return np.where(x < 0.5,
+                    np.power(2.0, 20 * x - 10) / 2,
+                    (2 - np.power(2.0, -20 * x + 10)) / 2)
+
+
+def ease_out_expo(x):
+    return 1 - np.power(2.0, -8 * np.asarray(x, dtype=np.float64))
+
+
+def ease_in_expo(x):
+    return np.power(2.0, 8 * np.asarray(x, dtype=np.float64) - 8)
+
+
+def ease_in_out_cubic(x):
+    x = np.asarray(x, dtype=np.float64)
+    return np.where(x < 0.5,
+                    4 * x * x * x,
+                    1 - np.power(-2 * x + 2, 3) / 2)
+
+
+EASINGS = {
+    'linear': linear,
+    'ease_in_out_expo': ease_in_out_expo,
+    'ease_out_expo': ease_out_expo,
+    'ease_in_expo': ease_in_expo,
+    'ease_in_out_cubic': ease_in_out_cubic,
+}
+
+
+def get_easing(easing):
+    """Resolve an easing given by name or as a vectorized callable."""
+    if callable(easing):
+        return easing
+    try:
+        return EASINGS[easing]
+    except KeyError:
+        raise ValueError(f"Unknown easing: {easing}") from None
+
+
+def frame_progress(frame_count):
+    """Progress (0..1) of each of `frame_count` frames, ending exactly on 1."""
+    return np.arange(frame_count, dtype=np.float64) / max(1, frame_count - 1)
+
+
+def keyframe_curve(progress, start, end, easing=linear):
+    """Interpolate from `start` to `end` along `progress` using `easing`."""
+    return start + (end - start) * get_easing(easing)(progress)
+
+
+def unique_params(opacity, scale, scale_quantum=0.0, opacity_levels=255):
+    """Deduplicate (opacity, scale) pairs before rasterization.
+
+    Returns the unique pairs as an (n, 2) array and, for every input frame,
+    the index of its pair.
+    """
+    opacity = np.round(np.asarray(opacity, dtype=np.float64) * opacity_levels) / opacity_levels
+    scale = np.asarray(scale, dtype=np.float64)
+    if scale_quantum:
+        scale = np.round(scale / scale_quantum) * scale_quantum
+    pairs = np.stack([opacity, scale], axis=1)
+    unique, inverse = np.unique(pairs, axis=0, return_inverse=True)
+    return unique, inverse.reshape(-1)
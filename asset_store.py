@@ -0,0 +1,100 @@
+import os
+import time
+import uuid
+from collections import OrderedDict
+from functools import lru_cache
+
+import numpy as np
+from PIL import Image
+from PIL.Image import Resampling
+from build_manifest import BuildManifest
+from render_profiler import PROFILER
+
+
+class AssetStore:
+    # Unused cache files are deleted after this many seconds; leftover temp files after an hour
+    MAX_AGE = 14 * 24 * 3600
+    TEMP_MAX_AGE = 3600
+
+    def __init__(self, cache_dir, max_mapped=8):
+        """Share decoded, resized backgrounds between worker processes.
+
+        Each distinct background (keyed by content hash and target resolution) is
+        decoded and LANCZOS-resized once and saved as a .npy file in `cache_dir`.
+        Every worker then memory-maps the same file read-only, so the pixels are
+        held once in the OS page cache instead of once per worker.
+        At most `max_mapped` backgrounds stay mapped per process, least-recently-used
+        first out, so long-lived workers do not accumulate mappings.
+        """
+        self.cache_dir = cache_dir
+        self.max_mapped = max_mapped
+        os.makedirs(cache_dir, exist_ok=True)
+        self._digests = {}
+        self._backgrounds = OrderedDict()
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def for_directory(cache_dir):
+        """Return the store for `cache_dir`, creating it once per process."""
+        return AssetStore(cache_dir)
+
+    def _content_digest(self, path):
+        """Hash a file's contents, rehashing only when its size or mtime changes."""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+        digest = self._digests.get(key)
+        if digest is None:
+            digest = self._digests[key] = BuildManifest.hash_file(path)
+        return digest
+
+    def background_path(self, image_path, res_x, res_y):
+        """Return the cache file holding `image_path` resized to (res_x, res_y)."""
+        return os.path.join(self.cache_dir, f"bg_{self._content_digest(image_path)}_{res_x}x{res_y}.npy")
+
+    def background(self, image_path, res_x, res_y):
+        """Return the resized RGBA background as a read-only memory-mapped array."""
+        path = self.background_path(image_path, res_x, res_y)
+        pixels = self._backgrounds.get(path)
+        if pixels is not None:
+            self._backgrounds.move_to_end(path)
+            PROFILER.count('asset_hits')
+            return pixels
+
+        if os.path.exists(path):
+            PROFILER.count('asset_hits')
+            # Mark the file as in use so `prune` keeps it
+            os.utime(path)
+        else:
+            PROFILER.count('asset_misses')
+            with PROFILER.timer('asset_decode'):
+                image = Image.open(image_path).convert("RGBA").resize((res_x, res_y), Resampling.LANCZOS)
+                # Workers may publish the same asset concurrently; each writes its own
+                # temp file and the atomic rename makes the result identical either way
+                temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+                with open(temp_path, 'wb') as f:
+                    np.save(f, np.asarray(image))
+                os.replace(temp_path, path)
+
+        pixels = self._backgrounds[path] = np.load(path, mmap_mode='r')
+        while len(self._backgrounds) > self.max_mapped:
+            self._backgrounds.popitem(last=False)
+        return pixels
+
+    def prune(self, max_age=None):
+        """Delete cached backgrounds unused for `max_age` seconds and stale temp files.
+
+        Returns the number of files removed. Files another process removes first are skipped.
+        """
+        max_age = self.MAX_AGE if max_age is None else max_age
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            limit = self.TEMP_MAX_AGE if name.endswith('.tmp') else max_age
+            try:
+                if now - os.stat(path).st_mtime > limit:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                continue
+        return removed
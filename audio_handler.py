@@ -1,6 +1,16 @@
+import os
+import subprocess
+import uuid
+from moviepy.config import get_setting
 from moviepy.editor import AudioFileClip
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos
+from build_manifest import BuildManifest
+from render_profiler import PROFILER
 
 class AudioHandler:
+    # Audio formats the MP4 muxer accepts as-is; anything else is transcoded to AAC once
+    PASSTHROUGH_EXTENSIONS = ('.mp3', '.m4a', '.aac')
+
     @staticmethod
     def load_audio(audio_path):
         """Load audio file and return AudioFileClip with duration."""
@@ -9,4 +19,49 @@ class AudioHandler:
             return audio, audio.duration
         except Exception as e:
             print(f"Error loading audio file: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def get_duration(audio_path):
+        """Return the audio duration in seconds from the file headers, without decoding."""
+        try:
+            return ffmpeg_parse_infos(audio_path)['duration']
+        except Exception as e:
+            print(f"Error reading audio duration: {str(e)}")
+            raise
+
+    @staticmethod
+    def prepare_audio(audio_path, cache_dir):
+        """Return an audio file that can be stream-copied into an MP4.
+
+        MP3 and AAC inputs are used directly. Other formats (e.g. WAV masters) are
+        transcoded to AAC once and cached in `cache_dir` under their content hash, so
+        later renders of the same song reuse the encoded audio.
+        """
+        if os.path.splitext(audio_path)[1].lower() in AudioHandler.PASSTHROUGH_EXTENSIONS:
+            return audio_path
+
+        os.makedirs(cache_dir, exist_ok=True)
+        cached_path = os.path.join(cache_dir, f"{BuildManifest.hash_file(audio_path)}.m4a")
+        if os.path.exists(cached_path):
+            PROFILER.count('audio_cache_hits')
+            return cached_path
+
+        PROFILER.count('audio_cache_misses')
+        # Workers may encode the same song concurrently; the atomic rename keeps one result
+        temp_path = f"{cached_path}.{uuid.uuid4().hex}.tmp.m4a"
+        command = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error', '-i', audio_path,
+                   '-vn', '-c:a', 'aac', temp_path]
+        try:
+            with PROFILER.timer('audio_encode'):
+                result = subprocess.run(command, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise IOError(f"ffmpeg failed while encoding {audio_path}: "
+                              f"{result.stderr.decode(errors='replace').strip()}")
+            os.replace(temp_path, cached_path)
+            return cached_path
+        except Exception as e:
+            print(f"Error preparing audio file: {str(e)}")
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
@@ -2,46 +2,210 @@ from PIL import Image
 from PIL.Image import Resampling
 from moviepy.editor import VideoClip
 import numpy as np
+from render_profiler import PROFILER
+
+
+# Motion presets map time to (zoom, pan_x, pan_y, angle). Zoom is >= 1, pans run from
+# -1 to 1 across the margin the zoom leaves free, and angle is in degrees.
+
+def breathing(t, duration, amplitude, frequency):
+    return 1 + amplitude * 0.5 * (1 + np.sin(2 * np.pi * frequency * t)), 0.0, 0.0, 0.0
+
+
+def pan(t, duration, amplitude, frequency):
+    return 1 + amplitude, float(np.sin(2 * np.pi * frequency * t)), 0.0, 0.0
+
+
+def ken_burns(t, duration, amplitude, frequency):
+    progress = min(1.0, t / duration) if duration else 0.0
+    return 1 + amplitude * progress, progress * 2 - 1, 0.5 - progress, 0.0
+
+
+def rotation(t, duration, amplitude, frequency):
+    # `amplitude` is the zoom headroom; the swing angle is sized to stay within it
+    return 1 + amplitude, 0.0, 0.0, 10 * amplitude * float(np.sin(2 * np.pi * frequency * t))
+
+
+MOTIONS = {
+    'breathing': breathing,
+    'pan': pan,
+    'ken_burns': ken_burns,
+    'rotation': rotation,
+}
+
+RESAMPLING = {
+    'nearest': Resampling.NEAREST,
+    'bilinear': Resampling.BILINEAR,
+    'bicubic': Resampling.BICUBIC,
+    'lanczos': Resampling.LANCZOS,
+}
+
+
+def get_motion(motion):
+    """Resolve a motion preset given by name or as a callable."""
+    if callable(motion):
+        return motion
+    try:
+        return MOTIONS[motion]
+    except KeyError:
+        raise ValueError(f"Unknown background motion: {motion}") from None
 
 
 class BackgroundAnimator:
-    def __init__(self, image_path, res_x=1920, res_y=1080):
-        """Initialize with path to background image."""
-        # Load the image using PIL
-        pil_image = Image.open(image_path).convert("RGBA")  # Ensure RGBA mode
+    def __init__(self, image_path, res_x=1920, res_y=1080, asset_store=None):
+        """Initialize with path to background image.
 
-        # Scale the image to 4K resolution (3840x2160)
-        self.pil_image = pil_image.resize((res_x, res_y), Resampling.LANCZOS)
+        With an `asset_store`, the decoded and resized image is shared read-only
+        with every other worker that uses the same background and resolution.
+        """
+        if asset_store is not None:
+            self.pil_image = Image.fromarray(asset_store.background(image_path, res_x, res_y))
+        else:
+            # Load the image using PIL
+            pil_image = Image.open(image_path).convert("RGBA")  # Ensure RGBA mode
+
+            # Scale the image to 4K resolution (3840x2160)
+            self.pil_image = pil_image.resize((res_x, res_y), Resampling.LANCZOS)
         self.original_size = (res_x, res_y)  # Update the size to 4K
 
-    def animate_background(self, duration, amplitude=0.1, frequency=0.08):
-        """Create a breathing animation effect matching audio duration."""
+        # RGB copy used by the affine engine, converted on first use
+        self._rgb_image = None
+
+    @property
+    def rgb_image(self):
+        if self._rgb_image is None:
+            self._rgb_image = self.pil_image.convert("RGB")
+        return self._rgb_image
+
+    def _render_scaled_frame(self, scale):
+        """Render the background zoomed by `scale` as an RGB array of the original size."""
+        w, h = self.original_size
+
+        # Calculate new dimensions
+        new_w = int(w * scale)
+        new_h = int(h * scale)
+
+        # Resize using LANCZOS
+        resized = self.pil_image.resize((new_w, new_h), Resampling.LANCZOS)
+
+        # Create a new image with original size and paste resized image in center
+        result = Image.new('RGBA', (w, h), (0, 0, 0, 0))
+        x = (w - new_w) // 2
+        y = (h - new_h) // 2
+        result.paste(resized, (x, y))
+
+        # Convert to numpy array and remove alpha channel (RGBA to RGB)
+        frame = np.array(result)
+        frame_rgb = frame[:, :, :3]  # Keep only RGB channels
+        return frame_rgb
+
+    def _render_affine_frame(self, out, zoom, pan_x=0.0, pan_y=0.0, angle=0.0, resample='lanczos'):
+        """Render one zoomed, panned and rotated view of the background into `out`.
+
+        Unrotated views are a single crop-and-resample of the source; rotated views are a
+        single affine transform (at most bicubic, the best filter PIL supports for it).
+        """
+        w, h = self.original_size
+        rgb_image = self.rgb_image
+
+        # Rotating by `angle` needs extra zoom so no empty corners show
+        radians = np.radians(angle)
+        cos, sin = abs(np.cos(radians)), abs(np.sin(radians))
+        zoom = max(zoom, cos + sin * max(w / h, h / w))
+
+        # Centre of the view in source pixels, panned across the margin left by the zoom
+        center_x = w / 2 + pan_x * (w - w / zoom) / 2
+        center_y = h / 2 + pan_y * (h - h / zoom) / 2
+
+        if not angle:
+            half_w, half_h = w / zoom / 2, h / zoom / 2
+            box = (center_x - half_w, center_y - half_h, center_x + half_w, center_y + half_h)
+            view = rgb_image.resize((w, h), RESAMPLING[resample], box=box)
+        else:
+            # Map each output pixel back into the source around the view centre
+            a, b = np.cos(radians) / zoom, np.sin(radians) / zoom
+            d, e = -np.sin(radians) / zoom, np.cos(radians) / zoom
+            c = center_x - a * w / 2 - b * h / 2
+            f = center_y - d * w / 2 - e * h / 2
+            resample_filter = RESAMPLING[resample]
+            if resample_filter == Resampling.LANCZOS:
+                resample_filter = Resampling.BICUBIC
+            view = rgb_image.transform((w, h), Image.Transform.AFFINE, (a, b, c, d, e, f),
+                                       resample=resample_filter)
+        np.copyto(out, np.asarray(view))
+        return out
+
+    def _create_frame_cache(self, cache_steps):
+        """Allocate the RGB frame cache."""
         w, h = self.original_size
-        base_img = self.pil_image
+        return np.empty((cache_steps, h, w, 3), dtype=np.uint8)
+
+    def animate_background(self, duration, amplitude=0.1, frequency=0.08, cache_steps=0,
+                           engine='resize', motion='breathing', resample='lanczos'):
+        """Create a breathing animation effect matching audio duration.
+
+        When `cache_steps` is set, the breathing scale is quantized into that many
+        levels. Each level is rendered once into a bounded RGB cache and every
+        later frame is an index lookup.
+
+        `engine='affine'` renders each frame with a single crop-and-resample (or affine
+        transform) of the RGB image into a reused buffer, using the `resample` filter
+        ('lanczos', 'bicubic', 'bilinear' or 'nearest'). It also supports the other
+        `motion` presets in MOTIONS; the default 'resize' engine only breathes.
+        """
+        if engine not in ('resize', 'affine'):
+            raise ValueError(f"Unknown background engine: {engine}")
+        if resample not in RESAMPLING:
+            raise ValueError(f"Unknown resampling filter: {resample}")
+        motion_function = get_motion(motion)
+        if engine == 'resize' and motion_function is not breathing:
+            raise ValueError(f"The resize background engine only supports breathing, not {motion}")
+
+        w, h = self.original_size
+
+        if engine == 'resize':
+            def render(out, zoom, *_):
+                out[:] = self._render_scaled_frame(zoom)
+        else:
+            def render(out, zoom, pan_x, pan_y, angle):
+                self._render_affine_frame(out, zoom, pan_x, pan_y, angle, resample)
+
+        if not cache_steps or motion_function is not breathing:
+            # Frames are freshly rendered on every call, so one buffer is reused for all of them
+            buffer = np.empty((h, w, 3), dtype=np.uint8)
 
-        def make_frame(t):
-            # Calculate scale factor using sine wave
-            scale = 1 + amplitude * 0.5 * (1 + np.sin(2 * np.pi * frequency * t))
+            def make_frame(t):
+                with PROFILER.timer('background_frame'):
+                    if engine == 'resize':
+                        # Calculate scale factor using sine wave
+                        scale = 1 + amplitude * 0.5 * (1 + np.sin(2 * np.pi * frequency * t))
+                        return self._render_scaled_frame(scale)
+                    render(buffer, *motion_function(t, duration, amplitude, frequency))
+                    return buffer
 
-            # Calculate new dimensions
-            new_w = int(w * scale)
-            new_h = int(h * scale)
+            # Use VideoClip for dynamic frame generation
+            return VideoClip(make_frame, duration=duration)
 
-            # Resize using LANCZOS
-            resized = base_img.resize((new_w, new_h), Resampling.LANCZOS)
+        cache_steps = max(2, int(cache_steps))
+        cache = self._create_frame_cache(cache_steps)
+        rendered = np.zeros(cache_steps, dtype=bool)
 
-            # Create a new image with original size and paste resized image in center
-            result = Image.new('RGBA', (w, h), (0, 0, 0, 0))
-            x = (w - new_w) // 2
-            y = (h - new_h) // 2
-            result.paste(resized, (x, y))
+        def make_cached_frame(t):
+            # Position on the sine wave (0..1) quantized to the nearest cache level
+            phase = 0.5 * (1 + np.sin(2 * np.pi * frequency * t))
+            index = int(round(phase * (cache_steps - 1)))
 
-            # Convert to numpy array and remove alpha channel (RGBA to RGB)
-            frame = np.array(result)
-            frame_rgb = frame[:, :, :3]  # Keep only RGB channels
-            return frame_rgb
+            if not rendered[index]:
+                with PROFILER.timer('background_frame'):
+                    render(cache[index], 1 + amplitude * index / (cache_steps - 1), 0.0, 0.0, 0.0)
+                rendered[index] = True
+                PROFILER.count('background_cache_misses')
+            else:
+                PROFILER.count('background_cache_hits')
 
-        # Use VideoClip for dynamic frame generation
-        clip = VideoClip(make_frame, duration=duration)
+            # Cached frames are shared between calls, so they are handed out read-only
+            frame = cache[index]
+            frame.flags.writeable = False
+            return frame
 
-        return clip
+        return VideoClip(make_cached_frame, duration=duration)
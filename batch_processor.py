@@ -1,11 +1,51 @@
+import copy
 import os
 import time
 import multiprocessing as mp
-from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
 from typing import List, Optional
 from video_generator import VideoGenerator
+from build_manifest import BuildManifest
+from job_manifest import JobManifest, STYLE_PRESETS
+from audio_handler import AudioHandler
+from job_scheduler import JobScheduler, RenderTask
+from text_overlay import load_font
+from render_profiler import PROFILER, RenderProfiler
+from encoder_probe import EncoderProbe
 import logging
 
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:  # Optional; the watcher falls back to polling
+    INotify = None
+
+
+def warm_worker(font_path):
+    """Pool initializer: load the font once so every later video in this worker starts warm."""
+    load_font(font_path, 160)
+
+
+class RenderBatch:
+    def __init__(self, tasks, config, manifest, job_hashes, segment_counts):
+        """Bookkeeping for one set of submitted tasks whose results may arrive in any order.
+
+        `config` is the resolved render config the tasks were planned with.
+        """
+        self.tasks = tasks
+        self.config = config
+        self.manifest = manifest
+        self.job_hashes = job_hashes
+        self.segment_counts = segment_counts
+        self.finished_segments = {video_num: {} for video_num in segment_counts}
+        self.failed_videos = set()
+        self.task_profiles = []
+        self.completed = 0
+        self.start_time = time.perf_counter()
+
+    @property
+    def done(self):
+        return self.completed == len(self.tasks)
+
 
 class ParallelBatchProcessor:
     def __init__(self, input_dir: str, output_dir: str, font_path: str, max_workers: Optional[int] = None):
@@ -13,29 +53,197 @@ class ParallelBatchProcessor:
         self.output_dir = output_dir
         self.font_path = font_path
         self.max_workers = max_workers or max(1, mp.cpu_count() - 1)
+        # Manifest jobs by id and their style presets; empty when jobs come from the input directory
+        self.jobs = {}
+        self.styles = dict(STYLE_PRESETS)
+        self.build_manifest_name = '.build_manifest.json'
         logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
         self.logger = logging.getLogger(__name__)
         os.makedirs(output_dir, exist_ok=True)
 
     @staticmethod
     def process_single_video(args: tuple) -> tuple:
-        video_num, input_dir, output_dir, font_path, config = args
+        video_num, input_dir, output_dir, font_path, config, job, style = args
         try:
             # Set up logger specific to this video process
             process_logger = logging.getLogger(f"Video_{video_num}")
             process_logger.setLevel(logging.INFO)
 
             # Create Video Generator instance with logger
-            generator = VideoGenerator(font_path, process_logger)
+            generator = VideoGenerator(font_path, process_logger, style)
 
             # Generate video
-            output_path = generator.create_video(video_num, input_dir, output_dir, config)
+            output_path = generator.create_video(video_num, input_dir, output_dir, config, job)
 
             return video_num, True, output_path
         except Exception as e:
             return video_num, False, str(e)
 
-    def process_videos_in_parallel(self, config):
+    @staticmethod
+    def process_single_segment(args: tuple) -> tuple:
+        video_num, input_dir, output_dir, font_path, config, segment_index, start, end, job, style = args
+        try:
+            process_logger = logging.getLogger(f"Video_{video_num}")
+            process_logger.setLevel(logging.INFO)
+
+            generator = VideoGenerator(font_path, process_logger, style)
+            segment_path = generator.render_segment(video_num, input_dir, output_dir, config,
+                                                    segment_index, start, end, job)
+
+            return video_num, True, segment_path
+        except Exception as e:
+            return video_num, False, str(e)
+
+    @staticmethod
+    def _run_task(task: tuple) -> tuple:
+        """Run one pool task, either a whole video or one time segment of a video.
+
+        Returns (kind, segment_index, (video_num, success, result), profile).
+        """
+        kind, args = task
+        config = args[4]
+
+        # Each task reports its own stage timings when profiling is enabled
+        PROFILER.enable(config.profile)
+        PROFILER.reset()
+        start_time = time.perf_counter()
+
+        if kind == 'segment':
+            segment_index, result = args[5], ParallelBatchProcessor.process_single_segment(args)
+        else:
+            segment_index, result = None, ParallelBatchProcessor.process_single_video(args)
+
+        profile = None
+        if config.profile:
+            profile = PROFILER.summarize(PROFILER.snapshot(), time.perf_counter() - start_time)
+        return kind, segment_index, result, profile
+
+    def _segments_per_video(self, config, video_count):
+        """Number of segments to split each video into (config.segments == 0 means auto)."""
+        if config.segments:
+            return config.segments
+        # Split videos only as far as needed to give every worker something to do
+        return max(1, -(-self.max_workers // video_count))
+
+    def _plan_tasks(self, video_numbers, config):
+        """Build cost-estimated pool tasks, splitting videos into time segments when requested.
+
+        Returns the task list and, for split videos, the number of segments each has.
+        """
+        input_dir = self.input_dir
+        output_dir = self.output_dir
+        segment_count = self._segments_per_video(config, len(video_numbers))
+        memory = RenderTask.estimate_memory(config)
+
+        tasks = []
+        segment_counts = {}
+        # Rank of each (style, font) group in order of first appearance; the scheduler
+        # dispatches equally expensive tasks group by group
+        groups = {}
+        for video_num in video_numbers:
+            job = self.jobs.get(video_num)
+            font_path, style = self._job_font(video_num), self._job_style(video_num)
+            group = groups.setdefault((job.style if job is not None else 'default', font_path), len(groups))
+            subtitles, duration = [], 0.0
+            try:
+                _, subtitle_path, audio_path = self._input_paths(video_num)
+                duration = AudioHandler.get_duration(audio_path)
+                subtitles = VideoGenerator.load_subtitles(subtitle_path, output_dir, config,
+                                                          style=style).to_subtitles()
+            except Exception as e:
+                # Let the worker render it whole and report the problem
+                self.logger.warning(f"Could not inspect video {video_num}: {str(e)}")
+
+            segments = [(0.0, None)]
+            # Cue previews are already short, so they are never split
+            if segment_count > 1 and duration and not config.preview_cues:
+                segments = VideoGenerator.plan_segments(subtitles, duration, segment_count, config.fps)
+
+            for segment_index, (start, end) in enumerate(segments):
+                end_time = duration if end is None else end
+                cue_count = sum(1 for cue_start, cue_duration, _ in subtitles
+                                if cue_start < end_time and cue_start + cue_duration > start)
+                cost = RenderTask.estimate_cost(end_time - start, config.fps, config.res_x, config.res_y, cue_count)
+
+                if len(segments) == 1:
+                    args = (video_num, input_dir, output_dir, font_path, config, job, style)
+                    tasks.append(RenderTask('video', args, cost, memory, group))
+                else:
+                    args = (video_num, input_dir, output_dir, font_path, config, segment_index, start, end,
+                            job, style)
+                    tasks.append(RenderTask('segment', args, cost, memory, group))
+
+            if len(segments) > 1:
+                segment_counts[video_num] = len(segments)
+        return tasks, segment_counts
+
+    def _publish_assets(self, video_numbers, config):
+        """Decode and resize each distinct background once, before workers start mapping them."""
+        asset_store = VideoGenerator.asset_store_for(self.output_dir, config)
+        removed = asset_store.prune()
+        if removed:
+            self.logger.info(f"Removed {removed} stale files from {asset_store.cache_dir}")
+        for video_num in video_numbers:
+            background_path, _, _ = self._input_paths(video_num)
+            try:
+                asset_store.background(background_path, config.res_x, config.res_y)
+            except Exception as e:
+                # The worker retries the load and reports the failure with its video
+                self.logger.warning(f"Could not prepare background for video {video_num}: {str(e)}")
+
+    def _resolve_encoder(self, config):
+        """Return a copy of `config` with the encoder probed once here.
+
+        Probing in the parent keeps every worker (and every segment of a video) on the
+        same encoder, so segments can still be joined without re-encoding.
+        """
+        resolved = copy.copy(config)
+        resolved.encoder = EncoderProbe.select(config.video_codec, config.encoder)
+        return resolved
+
+    def _split_encoder_threads(self, config, task_count):
+        """Give each running task an equal share of the cores unless `encoder_threads` was set.
+
+        Only min(max_workers, task_count) tasks run at once, so a batch smaller than the
+        pool still uses every core. Mutates the resolved `config` the planned tasks share.
+        """
+        if config.encoder_threads is None:
+            config.encoder_threads = EncoderProbe.threads_per_worker(min(self.max_workers, max(1, task_count)))
+        self.logger.info(f"Using video encoder {config.encoder} with {config.encoder_threads} threads per task")
+
+    @staticmethod
+    def _manifest_id(video_num, config):
+        """Manifest key of a job; preview tiers and cue previews are tracked separately from final renders."""
+        if config.output_variant == 'final':
+            return video_num
+        return f"{video_num}.{config.output_variant}"
+
+    def _input_paths(self, video_num):
+        """Input paths of a manifest job, or of a video found in the input directory."""
+        return VideoGenerator.job_input_paths(video_num, self.input_dir, self.jobs.get(video_num))
+
+    def _output_path(self, video_num, config):
+        return VideoGenerator.job_output_path(video_num, self.output_dir, config.output_variant, self.jobs.get(video_num))
+
+    def _job_font(self, video_num):
+        job = self.jobs.get(video_num)
+        return job.font if job is not None and job.font else self.font_path
+
+    def _job_style(self, video_num):
+        job = self.jobs.get(video_num)
+        return self.styles[job.style if job is not None else 'default']
+
+    def _job_hash(self, video_num, config):
+        """Hash a job's png/srt/audio/font and render config, or None if inputs are missing."""
+        background_path, subtitle_path, audio_path = self._input_paths(video_num)
+        input_paths = [background_path, subtitle_path, audio_path, self._job_font(video_num)]
+        if not all(path and os.path.exists(path) for path in input_paths):
+            return None
+        # Manifest jobs also hash their style; directory jobs always use the default style
+        style = self._job_style(video_num) if video_num in self.jobs else None
+        return BuildManifest.compute_job_hash(input_paths, config, style)
+
+    def process_videos_in_parallel(self, config, force=False):
         # Dynamically get video numbers based on available .srt or .png files in the input directory
         video_files = [f for f in os.listdir(self.input_dir) if f.endswith('.srt')]
         video_numbers = [int(f.split('.')[0]) for f in video_files]
@@ -45,20 +253,259 @@ class ParallelBatchProcessor:
             return
 
         self.logger.info(f"Found {len(video_numbers)} videos to process: {video_numbers}")
+        self._process_videos(video_numbers, config, force)
 
-        input_dir = self.input_dir
-        output_dir = self.output_dir
-        font_path = self.font_path
-
-        # Create a pool of workers to process videos in parallel
-        with mp.Pool(self.max_workers) as pool:
-            results = pool.map(self.process_single_video,
-                               [(video_num, input_dir, output_dir, font_path, config) for video_num in
-                                video_numbers])
-
-        # Log the results
-        for video_num, success, result in results:
-            if success:
-                self.logger.info(f"Successfully processed video {video_num}: {result}")
-            else:
-                self.logger.error(f"Failed to process video {video_num}: {result}")
+    def process_manifest(self, manifest_path, config, shard=None, force=False):
+        """Render the jobs listed in a JSON/TOML job manifest instead of scanning the input directory.
+
+        `shard=(index, count)` renders only this machine's share of the jobs, so several
+        machines can work through one catalog on a shared filesystem; each shard keeps
+        its own build manifest. All jobs go to the scheduler at once so no worker idles
+        between styles; among jobs within a factor of two in cost, those sharing a style
+        preset and font are dispatched together (see RenderTask.priority), which keeps
+        the workers' font, glyph and cue caches hot.
+        """
+        job_manifest = JobManifest.load(manifest_path)
+        jobs = job_manifest.jobs
+        if shard:
+            index, count = shard
+            jobs = job_manifest.shard(index, count)
+            self.build_manifest_name = f".build_manifest.shard{index}of{count}.json"
+            self.logger.info(f"Shard {index + 1}/{count}: {len(jobs)} of {len(job_manifest.jobs)} jobs")
+
+        if not jobs:
+            self.logger.info("No jobs to process.")
+            return
+
+        self.jobs = {job.job_id: job for job in jobs}
+        self.styles = job_manifest.styles
+        groups = JobManifest.group_by_style(jobs)
+        self.logger.info("Processing jobs by style: " +
+                         ", ".join(f"{group[0].style}: {len(group)}" for group in groups))
+        self._process_videos([job.job_id for group in groups for job in group], config, force)
+
+    def _create_scheduler(self, config, keep_workers=False):
+        """Create the job scheduler whose workers are warmed up with the batch font."""
+        # Longest jobs go first; results stream back as soon as each job finishes
+        return JobScheduler(
+            self.max_workers,
+            timeout=config.job_timeout,
+            retries=config.retries,
+            memory_budget=config.memory_budget_mb * 1024 * 1024 if config.memory_budget_mb else None,
+            logger=self.logger,
+            initializer=warm_worker,
+            initargs=(self.font_path,),
+            keep_workers=keep_workers
+        )
+
+    def _process_videos(self, video_numbers, config, force=False):
+        """Render the given videos on a fresh pool, skipping up-to-date ones, and wait for them."""
+        batch = self._start_batch(video_numbers, config, force)
+        if batch is None:
+            return
+        scheduler = self._create_scheduler(batch.config)
+        for task, task_result, error in scheduler.run(self._run_task, batch.tasks, succeeded=self._task_succeeded):
+            self._handle_result(batch, task, task_result, error)
+        self._finish_batch(batch)
+
+    @staticmethod
+    def _task_succeeded(task_result):
+        return task_result[2][1]
+
+    def _start_batch(self, video_numbers, config, force=False, manifest=None):
+        """Plan the render tasks of the given videos, or return None if all are up to date.
+
+        Batches running at the same time must share one `manifest`, or each would save
+        over the jobs the others recorded.
+        """
+        # Skip jobs whose inputs and config are unchanged since their last successful build
+        manifest = manifest or BuildManifest(os.path.join(self.output_dir, self.build_manifest_name))
+        job_hashes = {video_num: self._job_hash(video_num, config) for video_num in video_numbers}
+        if not force:
+            up_to_date = [video_num for video_num in video_numbers
+                          if job_hashes[video_num] and manifest.is_up_to_date(
+                              self._manifest_id(video_num, config), job_hashes[video_num],
+                              self._output_path(video_num, config))]
+            if up_to_date:
+                self.logger.info(f"Skipping {len(up_to_date)} up-to-date videos: {up_to_date}")
+            video_numbers = [video_num for video_num in video_numbers if video_num not in up_to_date]
+
+        if not video_numbers:
+            self.logger.info("All videos are up to date.")
+            return None
+
+        # Hashes above use the requested config; workers get the resolved encoder settings
+        config = self._resolve_encoder(config)
+
+        if config.shared_assets:
+            self._publish_assets(video_numbers, config)
+
+        tasks, segment_counts = self._plan_tasks(video_numbers, config)
+        self._split_encoder_threads(config, len(tasks))
+        if segment_counts:
+            self.logger.info(f"Splitting videos into time segments: {segment_counts}")
+
+        return RenderBatch(tasks, config, manifest, job_hashes, segment_counts)
+
+    def _handle_result(self, batch, task, task_result, error):
+        """Log and record one finished task; a crashed batch then resumes where it stopped."""
+        config, segment_counts = batch.config, batch.segment_counts
+        finished_segments, failed_videos = batch.finished_segments, batch.failed_videos
+        batch.completed += 1
+        self.logger.info(f"Progress: {batch.completed}/{len(batch.tasks)} tasks finished")
+        if task_result is None:
+            task_result = (task.kind, task.args[5] if task.kind == 'segment' else None,
+                           (task.args[0], False, error), None)
+        kind, segment_index, (video_num, success, result), profile = task_result
+        if profile:
+            batch.task_profiles.append(dict(profile, video=video_num, segment=segment_index, success=success))
+
+        if kind == 'segment':
+            if not success:
+                failed_videos.add(video_num)
+                self.logger.error(f"Failed to process video {video_num} segment {segment_index}: {result}")
+            finished_segments[video_num][segment_index] = result if success else None
+            if len(finished_segments[video_num]) < segment_counts[video_num]:
+                return
+
+            # All segments are in: join them, or clean up after a failed segment
+            segment_paths = [finished_segments[video_num][i] for i in range(segment_counts[video_num])]
+            if video_num in failed_videos:
+                for segment_index in range(segment_counts[video_num]):
+                    path = VideoGenerator.segment_path_for(video_num, self.output_dir, segment_index)
+                    if os.path.exists(path):
+                        os.remove(path)
+                self.logger.error(f"Failed to process video {video_num}: a segment failed")
+                return
+            try:
+                generator = VideoGenerator(self._job_font(video_num), self.logger, self._job_style(video_num))
+                result = generator.finalize_segments(video_num, self.input_dir, self.output_dir,
+                                                     segment_paths, config, self.jobs.get(video_num))
+            except Exception as e:
+                success, result = False, str(e)
+
+        if success:
+            self.logger.info(f"Successfully processed video {video_num}: {result}")
+            if batch.job_hashes[video_num]:
+                batch.manifest.record(self._manifest_id(video_num, config), batch.job_hashes[video_num], result)
+        else:
+            self.logger.error(f"Failed to process video {video_num}: {result}")
+
+    def _finish_batch(self, batch):
+        """Write the batch's profile report once all its tasks are in."""
+        if batch.config.profile:
+            self._write_profile_report(batch.config, batch.task_profiles, time.perf_counter() - batch.start_time)
+
+    def _write_profile_report(self, config, task_profiles, wall_seconds):
+        """Write per-task and aggregated stage timings for a batch as JSON."""
+        report = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'config': vars(config),
+            'workers': self.max_workers,
+            'tasks': task_profiles,
+            'totals': RenderProfiler.summarize(RenderProfiler.merge(task_profiles), wall_seconds),
+        }
+        # Microseconds and the pid keep reports of batches finishing in the same second apart
+        stamp = datetime.now().strftime('%Y%m%d-%H%M%S-%f')
+        report_path = os.path.join(self.output_dir, f"render_report_{stamp}_{os.getpid()}.json")
+        RenderProfiler.write_report(report_path, report)
+        self.logger.info(f"Wrote render profile to {report_path}")
+
+    def _find_complete_jobs(self):
+        """Return {video_num: input paths} for every number whose png, srt and audio all exist."""
+        jobs = {}
+        for f in os.listdir(self.input_dir):
+            stem, ext = os.path.splitext(f)
+            if ext != '.srt' or not stem.isdigit():
+                continue
+            paths = VideoGenerator.resolve_input_paths(int(stem), self.input_dir)
+            if all(path and os.path.exists(path) for path in paths):
+                jobs[int(stem)] = list(paths)
+        return jobs
+
+    def _open_watcher(self):
+        """Watch the input directory with inotify when available, otherwise return None."""
+        if INotify is None:
+            return None
+        try:
+            watcher = INotify()
+            watcher.add_watch(self.input_dir, inotify_flags.CLOSE_WRITE | inotify_flags.MOVED_TO |
+                              inotify_flags.CREATE | inotify_flags.DELETE)
+            return watcher
+        except OSError as e:
+            self.logger.warning(f"inotify unavailable, falling back to polling: {str(e)}")
+            return None
+
+    @staticmethod
+    def _wait_for_changes(watcher, timeout):
+        """Block until the input directory changes (inotify) or `timeout` seconds pass."""
+        if watcher is None:
+            time.sleep(timeout)
+        else:
+            # Collect a burst of events (e.g. an upload in progress) before rescanning
+            watcher.read(timeout=int(timeout * 1000), read_delay=1000)
+
+    def watch(self, config, poll_interval=30, settle_seconds=5):
+        """Run as a daemon, rendering each video once its png/srt/audio triple is complete and stable.
+
+        Inputs count as stable when their size and mtime are unchanged between two
+        scans and were last modified at least `settle_seconds` ago. Workers stay alive
+        between videos so imports and the loaded font are reused. Ready videos are
+        queued without waiting for earlier ones, so a new upload starts on an idle
+        worker while a long song is still rendering.
+        """
+        scheduler = self._create_scheduler(config, keep_workers=True)
+        watcher = self._open_watcher()
+        manifest = BuildManifest(os.path.join(self.output_dir, self.build_manifest_name))
+        observed_states = {}
+        submitted_states = {}
+        # Submitted tasks that have not finished, and the batch each belongs to
+        task_batches = {}
+        self.logger.info(f"Watching {self.input_dir} for new videos "
+                         f"({'inotify' if watcher else f'polling every {poll_interval}s'})")
+
+        try:
+            while True:
+                ready = []
+                settling = False
+                now = time.time()
+                for video_num, paths in sorted(self._find_complete_jobs().items()):
+                    try:
+                        states = [(os.stat(path).st_size, os.stat(path).st_mtime) for path in paths]
+                    except FileNotFoundError:
+                        continue
+                    stable = (observed_states.get(video_num) == states and
+                              all(now - mtime >= settle_seconds for _, mtime in states))
+                    observed_states[video_num] = states
+                    if not stable:
+                        settling = True
+                    elif submitted_states.get(video_num) != states:
+                        ready.append(video_num)
+                        submitted_states[video_num] = states
+
+                if ready:
+                    self.logger.info(f"Found {len(ready)} ready videos: {ready}")
+                    batch = self._start_batch(ready, config, manifest=manifest)
+                    if batch is not None:
+                        task_batches.update((task, batch) for task in batch.tasks)
+                        scheduler.submit(self._run_task, batch.tasks, succeeded=self._task_succeeded)
+
+                if not scheduler.busy:
+                    self._wait_for_changes(watcher, settle_seconds if settling else poll_interval)
+                    continue
+
+                # Handle results as they stream in, rescanning at least every `settle_seconds`
+                for task, task_result, error in scheduler.collect(timeout=settle_seconds):
+                    batch = task_batches.pop(task)
+                    self._handle_result(batch, task, task_result, error)
+                    if batch.done:
+                        self._finish_batch(batch)
+                if watcher is not None:
+                    # The rescan sees every change; only keep the event queue from filling up
+                    watcher.read(timeout=0)
+        except KeyboardInterrupt:
+            self.logger.info("Stopping watcher.")
+        finally:
+            scheduler.close()
+            if watcher is not None:
+                watcher.close()
@@ -0,0 +1,259 @@
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+import wave
+import multiprocessing as mp
+
+import numpy as np
+from PIL import Image
+
+from main import Config
+from background_animator import BackgroundAnimator
+from text_overlay import TextOverlay, CUE_STORE
+from subtitle_parser import SubtitleParser
+from video_generator import VideoGenerator
+from batch_processor import ParallelBatchProcessor
+from encoder_probe import EncoderProbe
+
+# Benchmark matrices: 'quick' runs in a couple of minutes, 'full' covers catalog-sized songs
+PRESETS = {
+    'quick': {
+        'resolutions': [(320, 180), (640, 360)],
+        'cue_counts': [10, 50],
+        'durations': [30],
+        'fps': 12,
+        'worker_counts': [1, 2],
+        'batch_size': 2,
+    },
+    'full': {
+        'resolutions': [(640, 360), (1280, 720), (1920, 1080)],
+        'cue_counts': [10, 100, 500],
+        'durations': [30, 120, 600],
+        'fps': 24,
+        'worker_counts': [1, 2, 4, 8],
+        'batch_size': 8,
+    },
+}
+
+# Render paths to time: the production default and the streaming path
+CONFIGURATIONS = {
+    'moviepy_clips': {'exporter': 'moviepy', 'overlay_mode': 'clips'},
+    'native_lazy': {'exporter': 'native', 'overlay_mode': 'lazy'},
+}
+
+WORDS = ("love night light heart fire dream rain sky wild home run stay fall rise "
+         "shadow river golden echo forever tonight broken ocean").split()
+
+
+def make_background(path, res_x, res_y, seed=0):
+    """Write a deterministic gradient-plus-noise PNG background."""
+    rng = np.random.default_rng(seed)
+    x = np.linspace(0, 255, res_x, dtype=np.float32)
+    y = np.linspace(0, 255, res_y, dtype=np.float32)[:, None]
+    image = np.stack([np.broadcast_to(x, (res_y, res_x)),
+                      np.broadcast_to(y, (res_y, res_x)),
+                      (x + y) / 2], axis=2)
+    image += rng.normal(0, 12, image.shape)
+    Image.fromarray(np.clip(image, 0, 255).astype(np.uint8)).save(path)
+
+
+def make_subtitles(path, cue_count, duration, seed=0):
+    """Write an SRT with `cue_count` cues of varying length spread over `duration` seconds."""
+    rng = random.Random(seed)
+    slot = duration / cue_count
+
+    def timestamp(seconds):
+        millis = int(round(seconds * 1000))
+        return f"{millis // 3600000:02d}:{millis // 60000 % 60:02d}:{millis // 1000 % 60:02d},{millis % 1000:03d}"
+
+    with open(path, 'w') as f:
+        for index in range(cue_count):
+            start = index * slot + rng.uniform(0, slot * 0.1)
+            end = start + slot * rng.uniform(0.5, 0.9)
+            text = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(2, 9)))
+            f.write(f"{index + 1}\n{timestamp(start)} --> {timestamp(end)}\n{text}\n\n")
+
+
+def make_silent_wav(path, duration, sample_rate=44100):
+    """Write a silent 16-bit stereo WAV of `duration` seconds."""
+    with wave.open(path, 'wb') as f:
+        f.setnchannels(2)
+        f.setsampwidth(2)
+        f.setframerate(sample_rate)
+        chunk = b'\0' * (sample_rate * 4)
+        for _ in range(int(duration)):
+            f.writeframes(chunk)
+        f.writeframes(b'\0' * int((duration % 1) * sample_rate) * 4)
+
+
+def make_song(input_dir, video_number, res_x, res_y, cue_count, duration, seed=0):
+    """Write a synthetic png/srt/wav triple for `video_number`."""
+    make_background(os.path.join(input_dir, f"{video_number}.png"), res_x, res_y, seed)
+    make_subtitles(os.path.join(input_dir, f"{video_number}.srt"), cue_count, duration, seed)
+    make_silent_wav(os.path.join(input_dir, f"{video_number}.wav"), duration)
+
+
+def time_call(function, repeat=1):
+    """Run `function` `repeat` times and return timing statistics in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return {'min_s': min(timings), 'median_s': statistics.median(timings), 'runs': timings}
+
+
+def bench_background(work_dir, resolutions, fps, repeat, seconds=10):
+    results = []
+    for res_x, res_y in resolutions:
+        path = os.path.join(work_dir, f"bg_{res_x}x{res_y}.png")
+        make_background(path, res_x, res_y)
+        animator = BackgroundAnimator(path, res_x=res_x, res_y=res_y)
+        frame_count = int(seconds * fps)
+        for cache_steps in (0, 48):
+            def run():
+                clip = animator.animate_background(seconds, cache_steps=cache_steps)
+                for index in range(frame_count):
+                    clip.get_frame(index / fps)
+
+            stats = time_call(run, repeat)
+            results.append(dict(stats, resolution=f"{res_x}x{res_y}", cache_steps=cache_steps,
+                                frames=frame_count, frames_per_s=frame_count / stats['min_s']))
+    return results
+
+
+def bench_text(work_dir, font_path, cue_counts, fps, repeat, duration=60):
+    results = []
+    for cue_count in cue_counts:
+        path = os.path.join(work_dir, f"cues_{cue_count}.srt")
+        make_subtitles(path, cue_count, duration)
+        subtitles = SubtitleParser.parse_subtitle_file(path)
+
+        def run():
+            # Repeats should not be served from cue animations rendered by the previous run
+            CUE_STORE.clear()
+            overlay = TextOverlay(font_path, font_size=160, shadow_spread=5, shadow_opacity=0.9,
+                                  shadow_color=(255, 255, 255), shadow_offset=(0, 0), resolution_scale=1,
+                                  cue_store=CUE_STORE)
+            for start, length, text in subtitles:
+                overlay.create_text_clip(text=text, start=start, duration=length, fps=fps)
+
+        stats = time_call(run, repeat)
+        results.append(dict(stats, cues=cue_count, ms_per_cue=1000 * stats['min_s'] / cue_count))
+    return results
+
+
+def bench_video(work_dir, font_path, resolutions, cue_counts, durations, fps, repeat, configurations):
+    results = []
+    generator = VideoGenerator(font_path)
+    for res_x, res_y in resolutions:
+        for cue_count in cue_counts:
+            for duration in durations:
+                input_dir = tempfile.mkdtemp(dir=work_dir)
+                make_song(input_dir, 1, res_x, res_y, cue_count, duration)
+                for name, config_options in configurations.items():
+                    config = Config(fps=fps, res_x=res_x, res_y=res_y, **config_options)
+
+                    def run():
+                        # Every run starts cold: no cue animations or subtitle cache from earlier runs,
+                        # which render the same synthetic lyrics
+                        CUE_STORE.clear()
+                        generator.create_video(1, input_dir, tempfile.mkdtemp(dir=work_dir), config)
+
+                    stats = time_call(run, repeat)
+                    frame_count = duration * fps
+                    results.append(dict(stats, configuration=name, resolution=f"{res_x}x{res_y}", cues=cue_count,
+                                        duration_s=duration, frames_per_s=frame_count / stats['min_s'],
+                                        realtime_factor=duration / stats['min_s']))
+    return results
+
+
+def bench_batch(work_dir, font_path, resolution, cue_count, duration, fps, batch_size, worker_counts,
+                configurations):
+    results = []
+    input_dir = tempfile.mkdtemp(dir=work_dir)
+    for video_number in range(1, batch_size + 1):
+        make_song(input_dir, video_number, resolution[0], resolution[1], cue_count, duration, seed=video_number)
+
+    for name, config_options in configurations.items():
+        config = Config(fps=fps, res_x=resolution[0], res_y=resolution[1], **config_options)
+        for workers in worker_counts:
+            def run():
+                # A fresh output directory (and fresh worker pool) keeps runs independent
+                processor = ParallelBatchProcessor(input_dir, tempfile.mkdtemp(dir=work_dir), font_path,
+                                                   max_workers=workers)
+                processor.process_videos_in_parallel(config, force=True)
+
+            stats = time_call(run)
+            results.append(dict(stats, configuration=name, workers=workers, videos=batch_size,
+                                videos_per_min=60 * batch_size / stats['min_s']))
+    return results
+
+
+def environment():
+    """Describe the machine and code revision the benchmark ran on."""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except OSError:
+        revision = None
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': mp.cpu_count(),
+        'numpy': np.__version__,
+        'encoder': EncoderProbe.select(),
+        'revision': revision,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the lyric video pipeline on synthetic songs")
+    parser.add_argument('--preset', choices=sorted(PRESETS), default='quick')
+    parser.add_argument('--font', default='klementin.otf')
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--output', default='bench_output.json')
+    parser.add_argument('--only', nargs='+', choices=['background', 'text', 'video', 'batch'],
+                        default=['background', 'text', 'video', 'batch'])
+    parser.add_argument('--keep-files', action='store_true', help="keep the generated inputs and outputs")
+    args = parser.parse_args()
+
+    preset = PRESETS[args.preset]
+    fps = preset['fps']
+    # The encoder falls back to CPU libx264 without a usable GPU, so runs work on any Linux box
+    work_dir = tempfile.mkdtemp(prefix='lvc_bench_')
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'preset': args.preset,
+              'environment': environment(), 'configurations': CONFIGURATIONS, 'results': {}}
+    try:
+        if 'background' in args.only:
+            report['results']['background'] = bench_background(work_dir, preset['resolutions'], fps, args.repeat)
+        if 'text' in args.only:
+            report['results']['text'] = bench_text(work_dir, args.font, preset['cue_counts'], fps, args.repeat)
+        if 'video' in args.only:
+            report['results']['video'] = bench_video(work_dir, args.font, preset['resolutions'],
+                                                     preset['cue_counts'], preset['durations'], fps,
+                                                     args.repeat, CONFIGURATIONS)
+        if 'batch' in args.only:
+            report['results']['batch'] = bench_batch(work_dir, args.font, preset['resolutions'][0],
+                                                     preset['cue_counts'][0], preset['durations'][0], fps,
+                                                     preset['batch_size'], preset['worker_counts'],
+                                                     CONFIGURATIONS)
+    finally:
+        if not args.keep_files:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote benchmark results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import hashlib
+import json
+import os
+
+
+class BuildManifest:
+    VERSION = 1
+    # Config fields that change the rendered file. Scheduling, worker and profiling options
+    # (retries, job_timeout, segments, encoder_threads, exporter, ...) are left out so that
+    # tuning them never forces a rebuild.
+    OUTPUT_FIELDS = ('fps', 'res_x', 'res_y', 'background_cache_steps', 'overlay_mode',
+                     'background_engine', 'background_motion', 'background_resample', 'quality',
+                     'text_scale', 'text_resample', 'shadow_blur', 'preview_cues', 'preview_padding',
+                     'audio_mode', 'video_codec', 'encoder', 'encoder_profile', 'encoder_preset')
+
+    def __init__(self, manifest_path):
+        """Load the build manifest recording the input hash of every finished job."""
+        self.manifest_path = manifest_path
+        self.jobs = {}
+
+        if os.path.exists(manifest_path):
+            try:
+                with open(manifest_path, 'r') as f:
+                    data = json.load(f)
+                if data.get('version') == self.VERSION:
+                    self.jobs = data.get('jobs', {})
+            except (OSError, ValueError) as e:
+                # A damaged manifest only costs a rebuild, never a failed batch
+                print(f"Ignoring unreadable build manifest {manifest_path}: {str(e)}")
+
+    @staticmethod
+    def hash_file(path, chunk_size=1 << 20):
+        """Return the SHA-256 hex digest of a file's contents."""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                digest.update(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def compute_job_hash(input_paths, config, style=None):
+        """Hash the contents of a job's input files with the output-affecting config fields and text style."""
+        digest = hashlib.sha256()
+        for path in input_paths:
+            digest.update(os.path.basename(path).encode())
+            digest.update(BuildManifest.hash_file(path).encode())
+        settings = {field: getattr(config, field, None) for field in BuildManifest.OUTPUT_FIELDS}
+        digest.update(json.dumps(settings, sort_keys=True, default=str).encode())
+        if style is not None:
+            digest.update(json.dumps(style, sort_keys=True, default=str).encode())
+        return digest.hexdigest()
+
+    def is_up_to_date(self, job_id, job_hash, output_path):
+        """True if the job was built from identical inputs and its output still exists."""
+        entry = self.jobs.get(str(job_id))
+        return (entry is not None and entry.get('hash') == job_hash
+                and entry.get('output') == output_path and os.path.exists(output_path))
+
+    def record(self, job_id, job_hash, output_path):
+        """Record a finished job and persist the manifest immediately."""
+        self.jobs[str(job_id)] = {'hash': job_hash, 'output': output_path}
+        self.save()
+
+    def save(self):
+        """Write the manifest atomically so a crash never leaves it half-written."""
+        temp_path = f"{self.manifest_path}.tmp"
+        with open(temp_path, 'w') as f:
+            json.dump({'version': self.VERSION, 'jobs': self.jobs}, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.manifest_path)
@@ -0,0 +1,148 @@
+import os
+import subprocess
+from functools import lru_cache
+from moviepy.config import get_setting
+
+# Encoders per codec, in order of preference; hardware encoders are only used if a test encode works
+ENCODER_CANDIDATES = {
+    'h264': ['h264_nvenc', 'h264_vaapi', 'libx264'],
+    'hevc': ['hevc_nvenc', 'hevc_vaapi', 'libx265'],
+    'av1': ['av1_nvenc', 'av1_vaapi', 'libsvtav1'],
+}
+
+# Size/speed trade-offs per output profile: constant quality (lower is bigger and better)
+# and the speed preset of each encoder family
+ENCODER_PROFILES = {
+    'draft': {'crf': 32, 'x26x': 'ultrafast', 'svtav1': '12', 'nvenc': 'p1'},
+    'fast': {'crf': 26, 'x26x': 'veryfast', 'svtav1': '10', 'nvenc': 'p2'},
+    'balanced': {'crf': 23, 'x26x': 'medium', 'svtav1': '8', 'nvenc': 'p4'},
+    'small': {'crf': 25, 'x26x': 'slow', 'svtav1': '5', 'nvenc': 'p7'},
+}
+
+VAAPI_DEVICE = '/dev/dri/renderD128'
+
+
+class EncoderSettings:
+    def __init__(self, encoder, global_args=(), filters=(), output_args=()):
+        """ffmpeg arguments for one encoder: global options, trailing video filters and output options."""
+        self.encoder = encoder
+        self.global_args = list(global_args)
+        self.filters = list(filters)
+        self.output_args = list(output_args)
+
+
+class EncoderProbe:
+    @staticmethod
+    def family(encoder):
+        """Return the option family of an encoder: 'x26x', 'svtav1', 'nvenc', 'vaapi' or None."""
+        if encoder in ('libx264', 'libx265'):
+            return 'x26x'
+        if encoder == 'libsvtav1':
+            return 'svtav1'
+        if encoder.endswith('_nvenc'):
+            return 'nvenc'
+        if encoder.endswith('_vaapi'):
+            return 'vaapi'
+        return None
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def listed_encoders():
+        """Names of the video encoders compiled into ffmpeg (probed once per process)."""
+        try:
+            result = subprocess.run([get_setting("FFMPEG_BINARY"), '-hide_banner', '-encoders'],
+                                    capture_output=True, text=True, timeout=30)
+        except (OSError, subprocess.TimeoutExpired):
+            return frozenset()
+        # Lines look like " V....D libx264              libx264 H.264 ..."
+        return frozenset(line.split()[1] for line in result.stdout.splitlines()
+                         if len(line.split()) > 1 and line.split()[0].startswith('V'))
+
+    @staticmethod
+    @lru_cache(maxsize=None)
+    def is_usable(encoder):
+        """True if `encoder` is compiled in and, for hardware encoders, a tiny test encode succeeds."""
+        if encoder not in EncoderProbe.listed_encoders():
+            return False
+        family = EncoderProbe.family(encoder)
+        if family not in ('nvenc', 'vaapi'):
+            return True
+        if family == 'vaapi' and not os.path.exists(VAAPI_DEVICE):
+            return False
+
+        settings = EncoderProbe.settings(encoder)
+        command = ([get_setting("FFMPEG_BINARY"), '-hide_banner', '-loglevel', 'error'] + settings.global_args +
+                   ['-f', 'lavfi', '-i', 'color=size=256x256:duration=0.2'])
+        if settings.filters:
+            command += ['-vf', ','.join(settings.filters)]
+        command += settings.output_args + ['-f', 'null', '-']
+        try:
+            return subprocess.run(command, capture_output=True, timeout=60).returncode == 0
+        except (OSError, subprocess.TimeoutExpired):
+            return False
+
+    @staticmethod
+    def select(codec='h264', encoder='auto'):
+        """Return the encoder to use: `encoder` itself, or the first usable candidate for `codec`.
+
+        Falls back to libx264, which every ffmpeg build MoviePy uses ships with.
+        """
+        if encoder != 'auto':
+            return encoder
+        try:
+            candidates = ENCODER_CANDIDATES[codec]
+        except KeyError:
+            raise ValueError(f"Unknown video codec: {codec}") from None
+        for candidate in candidates:
+            if EncoderProbe.is_usable(candidate):
+                return candidate
+        return 'libx264'
+
+    @staticmethod
+    def threads_per_worker(workers, cpu_count=None):
+        """Encoder threads per worker so that all workers together use every core once."""
+        cpu_count = cpu_count or os.cpu_count() or 1
+        return max(1, cpu_count // max(1, workers))
+
+    @staticmethod
+    def settings(encoder, profile=None, preset=None, threads=None):
+        """Build the ffmpeg arguments for `encoder`.
+
+        `profile` (a key of ENCODER_PROFILES) sets quality and speed. Without it, an
+        x264/x265 `preset` is passed through and other encoders use their defaults.
+        """
+        family = EncoderProbe.family(encoder)
+        tier = ENCODER_PROFILES[profile] if profile else None
+        global_args, filters = [], []
+        output_args = ['-c:v', encoder]
+
+        if family == 'x26x':
+            output_args += ['-preset', tier['x26x'] if tier else preset or 'medium']
+            if tier:
+                output_args += ['-crf', str(tier['crf'])]
+        elif family == 'svtav1':
+            output_args += ['-preset', tier['svtav1'] if tier else '8']
+            if tier:
+                output_args += ['-crf', str(tier['crf'] + 10)]  # AV1 CRF scale runs higher than x264's
+        elif family == 'nvenc':
+            output_args += ['-preset', tier['nvenc'] if tier else 'p4']
+            if tier:
+                output_args += ['-rc', 'vbr', '-cq', str(tier['crf'])]
+        elif family == 'vaapi':
+            global_args += ['-vaapi_device', VAAPI_DEVICE]
+            filters += ['format=nv12', 'hwupload']
+            if tier:
+                output_args += ['-qp', str(tier['crf'])]
+
+        if family != 'vaapi':
+            output_args += ['-pix_fmt', 'yuv420p']
+        # Hardware encoders do their work on the GPU; only CPU encoders take a thread count
+        if threads and family in ('x26x', 'svtav1'):
+            output_args += ['-threads', str(threads)]
+        return EncoderSettings(encoder, global_args, filters, output_args)
+
+    @staticmethod
+    def for_config(config):
+        """Encoder settings for a render config; 'auto' encoders are probed once per process."""
+        return EncoderProbe.settings(EncoderProbe.select(config.video_codec, config.encoder),
+                                     config.encoder_profile, config.encoder_preset, config.encoder_threads)
@@ -0,0 +1,161 @@
+import hashlib
+import inspect
+import json
+import os
+import re
+from text_overlay import TextOverlay
+
+try:
+    import tomllib
+except ImportError:  # Python < 3.11; JSON manifests still work
+    tomllib = None
+
+# Styles count `fade_frames` at this frame rate; renders at other rates keep the same fade duration
+FADE_BASE_FPS = 24
+
+# Named TextOverlay styles; manifests can add their own, optionally extending one of these
+STYLE_PRESETS = {
+    'default': {
+        'font_size': 160,  # Initial size; dynamic adjustment will follow
+        'shadow_spread': 5,  # Higher spread for high-res text
+        'shadow_opacity': 0.9,
+        'shadow_color': (255, 255, 255),
+        'shadow_offset': (0, 0),  # Adjusted for high resolution
+        'resolution_scale': 1,  # High resolution scale for crisp text
+        'fade_frames': 12,
+    },
+    'dark_shadow': {
+        'font_size': 160,
+        'shadow_spread': 6,
+        'shadow_opacity': 0.8,
+        'shadow_color': (0, 0, 0),
+        'shadow_offset': (4, 4),
+        'resolution_scale': 1,
+        'fade_frames': 12,
+    },
+}
+
+_JOB_ID = re.compile(r'^[A-Za-z0-9_.-]+$')
+
+# TextOverlay options a style may set; the font, quality tier and cue store come from the job and Config
+STYLE_OPTIONS = frozenset(inspect.signature(TextOverlay).parameters) - {
+    'font_path', 'size_scale', 'resample', 'shadow_blur', 'cue_store', 'glyph_cache_bytes'}
+
+
+class JobSpec:
+    def __init__(self, job_id, background, subtitles, audio, output, style='default', font=None):
+        """One render job from a manifest: explicit input paths, output path and style preset name."""
+        self.job_id = job_id
+        self.background = background
+        self.subtitles = subtitles
+        self.audio = audio
+        self.output = output
+        self.style = style
+        self.font = font
+
+    def input_paths(self):
+        """Return (background_path, subtitle_path, audio_path) like VideoGenerator.resolve_input_paths."""
+        return self.background, self.subtitles, self.audio
+
+    def output_path(self, variant='final'):
+        """Return the output path; previews (see Config.output_variant) get their own file next to it."""
+        if variant != 'final':
+            return f"{os.path.splitext(self.output)[0]}.{variant}.mp4"
+        return self.output
+
+
+class JobManifest:
+    def __init__(self, jobs, styles):
+        """Jobs in manifest order and the style presets (built-in plus manifest-defined) they use."""
+        self.jobs = jobs
+        self.styles = styles
+
+    @staticmethod
+    def load(path):
+        """Read a JSON or TOML job manifest.
+
+        Relative paths are resolved against the manifest's directory. Top-level
+        `defaults` supply a job's `style` and `font` when the job leaves them out.
+        """
+        if path.endswith('.toml'):
+            if tomllib is None:
+                raise ValueError(f"TOML manifests need Python 3.11 or newer: {path}")
+            with open(path, 'rb') as f:
+                data = tomllib.load(f)
+        else:
+            with open(path, 'r') as f:
+                data = json.load(f)
+
+        base_dir = os.path.dirname(os.path.abspath(path))
+
+        def resolve(value):
+            return value if value is None else os.path.join(base_dir, value)
+
+        styles = JobManifest._resolve_styles(data.get('styles', {}))
+        defaults = data.get('defaults', {})
+
+        jobs = []
+        seen = set()
+        for entry in data.get('jobs', []):
+            job_id = str(entry.get('id', ''))
+            if not _JOB_ID.match(job_id):
+                raise ValueError(f"Invalid job id {job_id!r} in {path}: use letters, digits, '_', '-' and '.'")
+            if job_id in seen:
+                raise ValueError(f"Duplicate job id {job_id!r} in {path}")
+            seen.add(job_id)
+
+            missing = [key for key in ('background', 'subtitles', 'audio', 'output') if not entry.get(key)]
+            if missing:
+                raise ValueError(f"Job {job_id} in {path} is missing {', '.join(missing)}")
+            style = entry.get('style', defaults.get('style', 'default'))
+            if style not in styles:
+                raise ValueError(f"Job {job_id} in {path} uses unknown style {style!r}")
+
+            jobs.append(JobSpec(job_id, resolve(entry['background']), resolve(entry['subtitles']),
+                                resolve(entry['audio']), resolve(entry['output']), style,
+                                resolve(entry.get('font', defaults.get('font')))))
+        return JobManifest(jobs, styles)
+
+    @staticmethod
+    def _resolve_styles(custom_styles):
+        """Merge manifest styles over the built-in presets, following `extends`."""
+        styles = {name: dict(style) for name, style in STYLE_PRESETS.items()}
+        pending = dict(custom_styles)
+        while pending:
+            progressed = False
+            for name, style in list(pending.items()):
+                parent = style.get('extends', 'default')
+                if parent in pending and parent != name:
+                    continue
+                if parent not in styles:
+                    raise ValueError(f"Style {name!r} extends unknown style {parent!r}")
+                unknown = sorted(set(style) - STYLE_OPTIONS - {'extends'})
+                if unknown:
+                    raise ValueError(f"Style {name!r} has unknown options {unknown}; "
+                                     f"valid options are {sorted(STYLE_OPTIONS)}")
+                options = {key: tuple(value) if isinstance(value, list) else value
+                           for key, value in style.items() if key != 'extends'}
+                styles[name] = dict(styles[parent], **options)
+                del pending[name]
+                progressed = True
+            if not progressed:
+                raise ValueError(f"Style presets extend each other in a cycle: {sorted(pending)}")
+        return styles
+
+    def shard(self, index, count):
+        """Return the jobs of shard `index` of `count`, split by a stable hash of the job id.
+
+        Every machine sharing the manifest computes the same split without coordination.
+        """
+        if not 0 <= index < count:
+            raise ValueError(f"Shard index {index} out of range for {count} shards")
+        return [job for job in self.jobs
+                if int(hashlib.sha256(job.job_id.encode()).hexdigest(), 16) % count == index]
+
+    @staticmethod
+    def group_by_style(jobs):
+        """Group jobs sharing a style preset and font, in order of each group's first job."""
+        groups = {}
+        for job in jobs:
+            groups.setdefault((job.style, job.font), []).append(job)
+        return list(groups.values())
@@ -0,0 +1,187 @@
+import logging
+import math
+import signal
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+
+
+class RenderTask:
+    def __init__(self, kind, args, cost=0.0, memory=0, group=0):
+        """A unit of pool work: `args` are passed to the worker together with `kind`.
+
+        Tasks with the same `group` (e.g. one text style and font) share worker caches.
+        """
+        self.kind = kind
+        self.args = args
+        self.cost = cost
+        self.memory = memory
+        self.group = group
+        self.attempts = 0
+
+    def priority(self):
+        """Dispatch order: costlier tasks first by power of two, then by group, then exact cost.
+
+        Tasks within a factor of two of each other finish at about the same time, so
+        running them group by group keeps caches warm without starting long jobs late.
+        """
+        return -math.frexp(self.cost)[1], self.group, -self.cost
+
+    @staticmethod
+    def estimate_cost(duration, fps, res_x, res_y, subtitle_count):
+        """Rough render cost: pixels to produce plus a per-subtitle rasterization charge."""
+        frames = duration * fps
+        return frames * res_x * res_y + subtitle_count * 50 * res_x * res_y
+
+    @staticmethod
+    def estimate_memory(config):
+        """Rough peak worker memory in bytes for a render at `config`'s resolution."""
+        frame_bytes = config.res_x * config.res_y * 3
+        # Interpreter, MoviePy and ffmpeg buffers plus a handful of working frames, the glyph
+        # cache and the cue animation store that fills up over a worker's lifetime
+        return (200 * 1024 * 1024 + frame_bytes * (config.background_cache_steps + 16)
+                + (config.glyph_cache_mb + (config.cue_store_mb or 0)) * 1024 * 1024)
+
+
+def _call_with_timeout(worker, task, timeout):
+    """Run `worker(task)` in a pool process, raising TimeoutError after `timeout` seconds."""
+    if not timeout or not hasattr(signal, 'SIGALRM'):
+        return worker(task)
+
+    def on_timeout(signum, frame):
+        raise TimeoutError(f"Job exceeded its {timeout}s time limit")
+
+    previous = signal.signal(signal.SIGALRM, on_timeout)
+    signal.alarm(int(max(1, timeout)))
+    try:
+        return worker(task)
+    finally:
+        signal.alarm(0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+class JobScheduler:
+    def __init__(self, max_workers, timeout=None, retries=0, memory_budget=None, logger=None,
+                 initializer=None, initargs=(), keep_workers=False):
+        """Dispatch RenderTasks longest-first (see RenderTask.priority) to a process pool and stream results back.
+
+        `memory_budget` (bytes) caps the summed memory estimate of running tasks;
+        one task is always allowed to run so an oversized job still makes progress.
+        With `keep_workers` the pool (warmed up by `initializer`) survives between
+        `run` calls until `close` is called.
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.retries = retries
+        self.memory_budget = memory_budget
+        self.logger = logger or logging.getLogger(__name__)
+        self.initializer = initializer
+        self.initargs = initargs
+        self.keep_workers = keep_workers
+        self._executor = None
+        # Tasks waiting for a worker, running futures, and the worker function and success
+        # test of the latest submission
+        self._pending = []
+        self._running = {}
+        self._worker = None
+        self._succeeded = None
+
+    def _get_executor(self):
+        """Return the worker pool, starting it if needed."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self.max_workers, initializer=self.initializer,
+                                                 initargs=self.initargs)
+        return self._executor
+
+    def close(self):
+        """Shut down the worker pool, dropping tasks that have not finished."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+        self._pending = []
+        self._running = {}
+
+    @property
+    def busy(self):
+        """True while submitted tasks are waiting or running."""
+        return bool(self._pending or self._running)
+
+    def _dispatch(self):
+        """Submit the most expensive pending tasks that fit the free workers and memory budget."""
+        memory_in_use = sum(task.memory for task in self._running.values())
+        for task in list(self._pending):
+            if len(self._running) >= self.max_workers:
+                break
+            if self.memory_budget and self._running and memory_in_use + task.memory > self.memory_budget:
+                continue
+            self._pending.remove(task)
+            task.attempts += 1
+            future = self._get_executor().submit(_call_with_timeout, self._worker, (task.kind, task.args),
+                                                 self.timeout)
+            self._running[future] = task
+            memory_in_use += task.memory
+
+    def submit(self, worker, tasks, succeeded):
+        """Queue `tasks` and start as many as fit, without waiting; `collect` returns their results.
+
+        `worker` must be a picklable function taking (kind, args); `succeeded(result)`
+        tells whether a returned result counts as success. Tasks already queued keep
+        running and share the pool with the new ones.
+        """
+        self._worker, self._succeeded = worker, succeeded
+        self._pending.extend(tasks)
+        self._pending.sort(key=RenderTask.priority)
+        self._dispatch()
+
+    def collect(self, timeout=None):
+        """Wait up to `timeout` seconds for running tasks and return those finished for good.
+
+        Returns a list of (task, result, error). Failed tasks are retried up to
+        `retries` times before being returned with their last result or error, and
+        freed workers immediately start the next pending tasks.
+        """
+        finished = []
+        if not self._running:
+            return finished
+        done, _ = wait(self._running, timeout=timeout, return_when=FIRST_COMPLETED)
+
+        pool_broken = False
+        for future in done:
+            task = self._running.pop(future)
+            result, error = None, None
+            try:
+                result = future.result()
+            except BrokenProcessPool as e:
+                pool_broken = True
+                error = f"Worker process died: {str(e)}"
+            except Exception as e:
+                error = str(e)
+
+            if error is None and self._succeeded(result):
+                finished.append((task, result, None))
+            elif task.attempts <= self.retries:
+                self.logger.warning(f"Retrying {task.kind} task {task.args[0]} "
+                                    f"(attempt {task.attempts + 1}): {error or result}")
+                self._pending.append(task)
+                self._pending.sort(key=RenderTask.priority)
+            else:
+                finished.append((task, result, error))
+
+        if pool_broken:
+            # A crashed worker poisons the whole executor; the next dispatch starts a fresh one
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._dispatch()
+        return finished
+
+    def run(self, worker, tasks, succeeded):
+        """Yield (task, result, error) for every task as soon as it finishes for good.
+
+        Blocking form of `submit` and `collect`; see `submit` for the arguments.
+        """
+        try:
+            self.submit(worker, tasks, succeeded)
+            while self.busy:
+                yield from self.collect()
+        finally:
+            if not self.keep_workers:
+                self.close()
@@ -1,15 +1,143 @@
+import argparse
 from batch_processor import ParallelBatchProcessor
 
+# Render settings per quality tier: resolution and text scale, fps cap, resampling filter,
+# shadow blur and encoder profile. 'final' keeps the requested settings unchanged.
+QUALITY_TIERS = {
+    'final': {'scale': 1.0, 'max_fps': None, 'resample': 'lanczos', 'shadow_blur': 'gaussian',
+              'encoder_profile': None},
+    'preview': {'scale': 0.5, 'max_fps': 12, 'resample': 'bilinear', 'shadow_blur': 'box',
+                'encoder_profile': 'fast'},
+    'draft': {'scale': 0.25, 'max_fps': 8, 'resample': 'nearest', 'shadow_blur': 'none',
+              'encoder_profile': 'draft'},
+}
+
 
 class Config:
-    def __init__(self, fps, res_x, res_y):
+    def __init__(self, fps, res_x, res_y, background_cache_steps=0, overlay_mode='clips',
+                 exporter='moviepy', encoder_preset='fast', encoder_threads=None, segments=1,
+                 job_timeout=None, retries=0, memory_budget_mb=None, profile=False,
+                 shared_assets=False, background_engine='resize', background_motion='breathing',
+                 background_resample='lanczos', quality='final', text_scale=1.0, text_resample='lanczos',
+                 shadow_blur='gaussian', preview_cues=None, preview_padding=1.0, audio_mode='clip',
+                 video_codec='h264', encoder='auto', encoder_profile=None, cue_store_mb=128,
+                 glyph_cache_mb=64):
         self.fps = fps
         self.res_x = res_x
         self.res_y = res_y
+        # Number of quantized breathing scales to pre-render (0 renders every frame)
+        self.background_cache_steps = background_cache_steps
+        # 'clips' composites one clip per subtitle, 'lazy' draws the active subtitle per frame
+        self.overlay_mode = overlay_mode
+        # 'moviepy' uses write_videofile, 'native' pipes raw frames to a single ffmpeg process
+        self.exporter = exporter
+        self.encoder_preset = encoder_preset
+        self.encoder_threads = encoder_threads
+        # Time segments rendered in parallel per video (1 disables splitting, 0 picks automatically)
+        self.segments = segments
+        # Scheduler limits: seconds per job, retries per failed job, and total memory for running jobs
+        self.job_timeout = job_timeout
+        self.retries = retries
+        self.memory_budget_mb = memory_budget_mb
+        # Collect per-stage timings and write a JSON report per batch
+        self.profile = profile
+        # Decode and resize each distinct background once per batch and share it between workers
+        self.shared_assets = shared_assets
+        # 'resize' zooms and pastes a resized copy per frame, 'affine' renders each frame with one
+        # crop-and-resample into a reused buffer and supports every motion preset
+        self.background_engine = background_engine
+        self.background_motion = background_motion
+        self.background_resample = background_resample
+        # Quality tier name (see QUALITY_TIERS); non-final renders get their own output file
+        self.quality = quality
+        self.text_scale = text_scale
+        self.text_resample = text_resample
+        self.shadow_blur = shadow_blur
+        # Cue numbers (as in the SRT file) to render on their own, each padded by `preview_padding` seconds
+        self.preview_cues = preview_cues
+        self.preview_padding = preview_padding
+        # 'clip' attaches the decoded audio to the MoviePy clip; 'mux' renders silent frames and
+        # stream-copies MP3/AAC audio (or AAC cached once per WAV) into the MP4 afterwards
+        self.audio_mode = audio_mode
+        # Video encoder: 'auto' picks NVENC/VAAPI for `video_codec` when usable, else the CPU encoder.
+        # `encoder_profile` (see encoder_probe.ENCODER_PROFILES) sets quality and speed; without it
+        # `encoder_preset` applies to x264/x265. `encoder_threads=None` splits the cores between workers.
+        self.video_codec = video_codec
+        self.encoder = encoder
+        self.encoder_profile = encoder_profile
+        # Megabytes of rendered cue animations each worker keeps for repeated lines (0 disables)
+        self.cue_store_mb = cue_store_mb
+        # Megabytes of rasterized text each worker caches while rendering a video's subtitles
+        self.glyph_cache_mb = glyph_cache_mb
+
+    @property
+    def output_variant(self):
+        """Name of this render's output: 'final' for full videos, else the tier and/or 'cues'.
+
+        Each variant gets its own output file and build manifest entry, so previews
+        never replace the final video.
+        """
+        if self.preview_cues:
+            return 'cues' if self.quality == 'final' else f"{self.quality}.cues"
+        return self.quality
+
+    @classmethod
+    def for_quality(cls, quality, fps, res_x, res_y, **options):
+        """Build a Config for a quality tier from the final-output fps and resolution.
+
+        Lower tiers shrink resolution and text together, cap the fps and use cheaper
+        resampling, shadow blur and encoder settings; `options` override any of them.
+        """
+        try:
+            tier = QUALITY_TIERS[quality]
+        except KeyError:
+            raise ValueError(f"Unknown quality tier: {quality}") from None
+
+        settings = {
+            # libx264 needs even frame dimensions
+            'res_x': max(2, int(res_x * tier['scale']) // 2 * 2),
+            'res_y': max(2, int(res_y * tier['scale']) // 2 * 2),
+            'fps': min(fps, tier['max_fps']) if tier['max_fps'] else fps,
+            'quality': quality,
+            'text_scale': tier['scale'],
+            'text_resample': tier['resample'],
+            'shadow_blur': tier['shadow_blur'],
+            'encoder_profile': tier['encoder_profile'],
+        }
+        if quality != 'final':
+            settings.update(background_engine='affine', background_resample=tier['resample'])
+        settings.update(options)
+        return cls(**settings)
+
+
+def parse_shard(value):
+    """Parse an 'I/N' shard argument into (I, N)."""
+    try:
+        index, count = (int(part) for part in value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"expected I/N, got {value!r}") from None
+    if not 0 <= index < count:
+        raise argparse.ArgumentTypeError(f"shard index must be between 0 and {count - 1}")
+    return index, count
 
 
 def main():
     """Example usage of the parallel batch processor."""
+    parser = argparse.ArgumentParser(description="Batch lyric video generator")
+    parser.add_argument('--watch', action='store_true',
+                        help="keep running and render new videos as they appear in the input directory")
+    parser.add_argument('--poll-interval', type=float, default=30,
+                        help="seconds between directory scans when inotify is unavailable")
+    parser.add_argument('--quality', choices=list(QUALITY_TIERS), default='final',
+                        help="render at full quality or as a faster, smaller preview or draft")
+    parser.add_argument('--cues', type=int, nargs='+',
+                        help="render only the time around the subtitles with these SRT numbers")
+    parser.add_argument('--manifest',
+                        help="render the jobs listed in this JSON/TOML job manifest instead of scanning input_files")
+    parser.add_argument('--shard', type=parse_shard,
+                        help="with --manifest, render only shard I of N (e.g. 0/4) of the jobs")
+    args = parser.parse_args()
+
     # Configuration
     input_dir = "input_files"
     output_dir = "output_files"
@@ -26,10 +154,16 @@ def main():
     )
 
     # config = Config(fps=current_fps, res_x=int(2560 / div), res_y=int(1440 / div))
-    config = Config(fps=current_fps, res_x=int(1920 / div), res_y=int(1080 / div))
+    config = Config.for_quality(args.quality, fps=current_fps, res_x=int(1920 / div), res_y=int(1080 / div),
+                                preview_cues=args.cues)
 
     print(f"x : {config.res_x}, y : {config.res_y}, fps: {config.fps}")
-    processor.process_videos_in_parallel(config)
+    if args.manifest:
+        processor.process_manifest(args.manifest, config, shard=args.shard)
+    elif args.watch:
+        processor.watch(config, poll_interval=args.poll_interval)
+    else:
+        processor.process_videos_in_parallel(config)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,181 @@
+import numpy as np
+from render_profiler import PROFILER
+
+
+class OverlayRenderer:
+    def __init__(self, text_overlay, timeline):
+        """Lazily render subtitles into background frames without per-cue clips.
+
+        `timeline` is the frame-indexed SubtitleTimeline, compiled at the render fps.
+        """
+        self.text_overlay = text_overlay
+        self.timeline = timeline
+        self.fps = timeline.fps
+        # (fade_frames, main_frames) per cue, straight from its whole-frame length
+        self.sections = [text_overlay.cue_sections(end - start)
+                         for start, end in zip(timeline.starts.tolist(), timeline.ends.tolist())]
+
+        self.current_cue = None
+        self.current_curves = None
+        # Per section (fade-in, main, fade-out) of the current cue: its first frame, the frames
+        # found in the cue store, and the frames rendered so far for sections that were not
+        self.section_starts = None
+        self.stored_frames = None
+        self.pending_frames = None
+        self.pending_counts = None
+        # Frames rendered for the current cue by (opacity, quantized scale), so collected
+        # sections share arrays the way whole rendered sequences do
+        self.rendered = None
+
+        # Reused output frame for read-only (cached) backgrounds, the background frame it
+        # was copied from and the region last drawn into it
+        self.frame_buffer = None
+        self.buffer_source = None
+        self.dirty_rect = None
+        # Reused uint16 blend buffers, grown to the largest overlay seen
+        self.scratch = np.empty(0, dtype=np.uint16)
+
+    def render_overlay(self, t):
+        """Return the RGBA glyph image for time `t` as a NumPy array, or None."""
+        frame_number = int(t * self.fps + 1e-6)
+        index = self.timeline.cue_at(frame_number)
+        if index is None:
+            return None
+
+        text = self.timeline.texts[index]
+
+        fade_frames, main_frames = self.sections[index]
+
+        # Frame size and animation curves depend on the cue, so refresh them when it changes
+        if index != self.current_cue:
+            self.text_overlay._calculate_base_size(text)
+            self.current_curves = self.text_overlay.cue_curves(main_frames, fade_frames)
+            self.section_starts = (0, fade_frames, fade_frames + main_frames)
+            # Repeated lines reuse sections from the shared cue store; nothing is rendered ahead
+            self.stored_frames = self.text_overlay.stored_cue_frames(text, main_frames, fade_frames)
+            self.pending_frames = [None, None, None]
+            self.pending_counts = [0, 0, 0]
+            self.rendered = {}
+            self.current_cue = index
+
+        local_frame = frame_number - int(self.timeline.starts[index])
+        opacities, scales = self.current_curves
+        if local_frame >= len(opacities):
+            return None
+
+        section = 2 if local_frame >= self.section_starts[2] else 1 if local_frame >= self.section_starts[1] else 0
+        offset = local_frame - self.section_starts[section]
+        stored = self.stored_frames[section]
+        if stored is not None:
+            return stored[offset]
+
+        opacity, scale = float(opacities[local_frame]), float(scales[local_frame])
+        if self.text_overlay.cue_store is None:
+            return np.asarray(self.text_overlay.generate_text_image(text, opacity=opacity, scale=scale))
+
+        quantum = self.text_overlay.scale_quantum if self.text_overlay.glyph_cache_size > 0 else 0.0
+        key = (opacity, round(scale / quantum) if quantum else scale)
+        overlay = self.rendered.get(key)
+        if overlay is None:
+            overlay = self.rendered[key] = np.asarray(
+                self.text_overlay.generate_text_image(text, opacity=opacity, scale=scale))
+        self._collect(text, section, offset, overlay)
+        return overlay
+
+    def _collect(self, text, section, offset, overlay):
+        """Keep a rendered frame and store its section once every frame of it was rendered."""
+        pending = self.pending_frames[section]
+        if pending is None:
+            section_end = self.section_starts[section + 1] if section < 2 else len(self.current_curves[0])
+            pending = self.pending_frames[section] = [None] * (section_end - self.section_starts[section])
+        if pending[offset] is None:
+            pending[offset] = overlay
+            self.pending_counts[section] += 1
+        if self.pending_counts[section] == len(pending):
+            fade_frames, main_frames = self.sections[self.current_cue]
+            self.text_overlay.store_cue_frames(text, main_frames, section, pending, fade_frames)
+            self.stored_frames[section] = pending
+
+    @staticmethod
+    def overlay_rect(frame_shape, overlay_shape):
+        """Return the (x, y, x1, y1, x2, y2) placement of a centred overlay, or None if off-frame.
+
+        (x, y) is the overlay origin; (x1, y1)-(x2, y2) is its visible part in frame coordinates.
+        """
+        frame_h, frame_w = frame_shape[:2]
+        overlay_h, overlay_w = overlay_shape[:2]
+
+        # Centre the overlay the way MoviePy does and clip it to the frame bounds
+        x = int((frame_w - overlay_w) / 2)
+        y = int((frame_h - overlay_h) / 2)
+        x1, y1 = max(0, x), max(0, y)
+        x2, y2 = min(frame_w, x + overlay_w), min(frame_h, y + overlay_h)
+        if x1 >= x2 or y1 >= y2:
+            return None
+        return x, y, x1, y1, x2, y2
+
+    def blend(self, frame, overlay, rect):
+        """Alpha-blend an RGBA `overlay` into `rect` of the RGB `frame` in place.
+
+        Uses integer arithmetic in reused buffers, so only the overlay region is touched.
+        """
+        x, y, x1, y1, x2, y2 = rect
+        source = overlay[y1 - y:y2 - y, x1 - x:x2 - x]
+        region = frame[y1:y2, x1:x2]
+
+        size = region.size
+        if self.scratch.size < 2 * size:
+            self.scratch = np.empty(2 * size, dtype=np.uint16)
+        blended = self.scratch[:size].reshape(region.shape)
+        inverse = self.scratch[size:2 * size].reshape(region.shape)
+
+        # region = (rgb * a + region * (255 - a) + 127) // 255; the sum fits in uint16
+        alpha = source[:, :, 3:4]
+        np.multiply(source[:, :, :3], alpha, out=blended, dtype=np.uint16)
+        np.subtract(255, alpha, out=inverse, dtype=np.uint16)
+        np.multiply(inverse, region, out=inverse)
+        np.add(blended, inverse, out=blended)
+        np.add(blended, 127, out=blended)
+        np.floor_divide(blended, 255, out=blended)
+        region[:] = blended
+        return frame
+
+    def _output_frame(self, frame):
+        """Return a frame the overlay may be drawn into.
+
+        Writeable frames are freshly rendered for this call and are drawn into directly.
+        Read-only frames come from the background cache; they are copied into a reused
+        buffer, and when the same cached frame repeats only the last dirty region is restored.
+        """
+        if frame.flags.writeable:
+            return frame
+
+        source = (frame.__array_interface__['data'][0], frame.shape)
+        if self.frame_buffer is None or self.frame_buffer.shape != frame.shape:
+            self.frame_buffer = np.empty_like(frame)
+            self.buffer_source = None
+
+        if source != self.buffer_source:
+            np.copyto(self.frame_buffer, frame)
+            self.buffer_source = source
+        elif self.dirty_rect is not None:
+            _, _, x1, y1, x2, y2 = self.dirty_rect
+            self.frame_buffer[y1:y2, x1:x2] = frame[y1:y2, x1:x2]
+        self.dirty_rect = None
+        return self.frame_buffer
+
+    def apply(self, get_frame, t):
+        """MoviePy `fl` filter drawing the active subtitle onto the background."""
+        frame = get_frame(t)
+        overlay = self.render_overlay(t)
+        if overlay is None:
+            return frame
+        rect = self.overlay_rect(frame.shape, overlay.shape)
+        if rect is None:
+            return frame
+        with PROFILER.timer('composite'):
+            output = self._output_frame(frame)
+            self.blend(output, overlay, rect)
+            if output is self.frame_buffer:
+                self.dirty_rect = rect
+            return output
@@ -0,0 +1,124 @@
+import json
+import os
+import time
+from contextlib import nullcontext
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+class _StageTimer:
+    __slots__ = ('profiler', 'stage', 'start')
+
+    def __init__(self, profiler, stage):
+        self.profiler = profiler
+        self.stage = stage
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler.add_time(self.stage, time.perf_counter() - self.start)
+        return False
+
+
+class RenderProfiler:
+    _DISABLED = nullcontext()
+
+    def __init__(self):
+        """Per-process stage timers and counters; disabled (and free) unless enabled."""
+        self.enabled = False
+        self.stages = {}
+        self.counters = {}
+
+    def enable(self, enabled=True):
+        self.enabled = enabled
+
+    def reset(self):
+        self.stages = {}
+        self.counters = {}
+
+    def timer(self, stage):
+        """Context manager timing one call of `stage`; a shared no-op when disabled."""
+        if not self.enabled:
+            return self._DISABLED
+        return _StageTimer(self, stage)
+
+    def add_time(self, stage, seconds):
+        entry = self.stages.get(stage)
+        if entry is None:
+            self.stages[stage] = [1, seconds]
+        else:
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, name, amount=1):
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    @staticmethod
+    def peak_rss_mb():
+        """Peak resident set size of this process in MB, or None if unknown."""
+        if resource is None:
+            return None
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def snapshot(self):
+        """Return the collected stats as a JSON-serializable dict."""
+        return {
+            'stages': {stage: {'calls': calls, 'total_s': total} for stage, (calls, total) in self.stages.items()},
+            'counters': dict(self.counters),
+            'peak_rss_mb': self.peak_rss_mb(),
+            'pid': os.getpid(),
+        }
+
+    @staticmethod
+    def summarize(snapshot, wall_seconds=None):
+        """Add ms-per-frame, frames/sec and cache hit rates to a snapshot."""
+        summary = dict(snapshot)
+        frames = snapshot['counters'].get('frames', 0)
+        summary['stages'] = {
+            stage: dict(stats,
+                        ms_per_call=1000 * stats['total_s'] / max(1, stats['calls']),
+                        ms_per_frame=1000 * stats['total_s'] / frames if frames else None)
+            for stage, stats in snapshot['stages'].items()
+        }
+        if wall_seconds:
+            summary['wall_s'] = wall_seconds
+            summary['frames_per_s'] = frames / wall_seconds
+
+        hit_rates = {}
+        for name, hits in snapshot['counters'].items():
+            if name.endswith('_hits'):
+                prefix = name[:-len('_hits')]
+                lookups = hits + snapshot['counters'].get(f"{prefix}_misses", 0)
+                hit_rates[prefix] = hits / lookups if lookups else None
+        summary['cache_hit_rates'] = hit_rates
+        return summary
+
+    @staticmethod
+    def merge(snapshots):
+        """Aggregate snapshots from several tasks or workers into one."""
+        merged = {'stages': {}, 'counters': {}, 'peak_rss_mb': None}
+        for snapshot in snapshots:
+            for stage, stats in snapshot['stages'].items():
+                entry = merged['stages'].setdefault(stage, {'calls': 0, 'total_s': 0.0})
+                entry['calls'] += stats['calls']
+                entry['total_s'] += stats['total_s']
+            for name, value in snapshot['counters'].items():
+                merged['counters'][name] = merged['counters'].get(name, 0) + value
+            if snapshot.get('peak_rss_mb') is not None:
+                merged['peak_rss_mb'] = max(merged['peak_rss_mb'] or 0, snapshot['peak_rss_mb'])
+        return merged
+
+    @staticmethod
+    def write_report(report_path, report):
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+
+
+# Process-wide profiler used by every pipeline stage
+PROFILER = RenderProfiler()
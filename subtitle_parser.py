@@ -1,10 +1,154 @@
+import os
+import uuid
+import numpy as np
 import pysrt
+from build_manifest import BuildManifest
+
+
+class SubtitleTimeline:
+    VERSION = 2
+
+    def __init__(self, starts, ends, texts, fps, issues=None, numbers=None):
+        """A sorted, non-overlapping cue index in whole frames.
+
+        Cue i is shown on frames starts[i] <= k < ends[i]; numbers[i] is its index in
+        the source SRT file. `issues` lists the problems found (and fixed) while
+        normalizing the source subtitles.
+        """
+        self.starts = np.asarray(starts, dtype=np.int64)
+        self.ends = np.asarray(ends, dtype=np.int64)
+        self.texts = list(texts)
+        self.numbers = np.asarray(range(1, len(self.texts) + 1) if numbers is None else numbers, dtype=np.int64)
+        self.fps = fps
+        self.issues = issues or []
+
+    def __len__(self):
+        return len(self.texts)
+
+    @classmethod
+    def from_subtitles(cls, subtitles, fps, min_frames=0, numbers=None):
+        """Compile (start, duration, text) cues into a normalized frame timeline.
+
+        Cues are sorted and quantized to frames. Empty and zero-length cues are
+        dropped, overlapping cues are cut at the start of the next cue, and cues
+        shorter than `min_frames` (room for a fade in and out) are lengthened up
+        to the next cue. Cues that still fall short are kept and logged as such;
+        the renderer shortens their fades to fit. `numbers` are the cues' SRT
+        indices (1, 2, ... by default).
+        """
+        issues = []
+        cues = []
+        numbers = range(1, len(subtitles) + 1) if numbers is None else numbers
+        for number, (start, duration, text) in zip(numbers, subtitles):
+            start_frame = int(round(start * fps))
+            end_frame = int(round((start + duration) * fps))
+            if not text.strip():
+                issues.append(f"cue {number}: empty text, dropped")
+            elif end_frame <= start_frame:
+                issues.append(f"cue {number}: shorter than one frame, dropped")
+            else:
+                cues.append((start_frame, end_frame, number, text))
+        cues.sort()
+
+        starts, ends, texts, kept_numbers = [], [], [], []
+        for index, (start_frame, end_frame, number, text) in enumerate(cues):
+            next_start = cues[index + 1][0] if index + 1 < len(cues) else None
+            if next_start is not None and end_frame > next_start:
+                issues.append(f"cue {number}: overlaps the next cue, cut at frame {next_start}")
+                end_frame = next_start
+            if end_frame <= start_frame:
+                issues.append(f"cue {number}: starts together with the next cue, dropped")
+                continue
+            if end_frame - start_frame < min_frames:
+                target = start_frame + min_frames
+                end_frame = target if next_start is None else max(end_frame, min(target, next_start))
+                if end_frame - start_frame < min_frames:
+                    issues.append(f"cue {number}: shorter than {min_frames} frames with no room before the next "
+                                  f"cue at frame {next_start}; left at {end_frame - start_frame} frames with "
+                                  f"shortened fades")
+                else:
+                    issues.append(f"cue {number}: shorter than {min_frames} frames, extended to frame {end_frame}")
+            starts.append(start_frame)
+            ends.append(end_frame)
+            texts.append(text)
+            kept_numbers.append(number)
+
+        return cls(starts, ends, texts, fps, issues, kept_numbers)
+
+    def cue_at(self, frame):
+        """Return the index of the cue shown on `frame`, or None (binary search)."""
+        index = int(np.searchsorted(self.starts, frame, side='right')) - 1
+        if index < 0 or frame >= self.ends[index]:
+            return None
+        return index
+
+    def cue_numbered(self, number):
+        """Return the index of the cue with SRT index `number`, or None if it was dropped or never existed."""
+        matches = np.flatnonzero(self.numbers == number)
+        return int(matches[0]) if matches.size else None
+
+    def to_subtitles(self):
+        """Return the normalized cues as (start, duration, text) in seconds."""
+        return [(start / self.fps, (end - start) / self.fps, text)
+                for start, end, text in zip(self.starts.tolist(), self.ends.tolist(), self.texts)]
+
+    def save(self, path):
+        """Write the timeline as a binary .npz index, atomically."""
+        encoded = [text.encode('utf-8') for text in self.texts]
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp.npz"
+        np.savez(temp_path, version=self.VERSION, fps=self.fps, starts=self.starts, ends=self.ends, numbers=self.numbers,
+                 text_bytes=np.frombuffer(b''.join(encoded), dtype=np.uint8),
+                 text_ends=np.cumsum([len(text) for text in encoded], dtype=np.int64),
+                 issues=np.array(self.issues, dtype=str))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """Read a timeline written by `save`, or return None if it is stale or unreadable."""
+        try:
+            with np.load(path) as data:
+                if int(data['version']) != cls.VERSION:
+                    return None
+                text_bytes = data['text_bytes'].tobytes()
+                text_starts = [0] + data['text_ends'].tolist()
+                texts = [text_bytes[start:end].decode('utf-8')
+                         for start, end in zip(text_starts[:-1], text_starts[1:])]
+                return cls(data['starts'], data['ends'], texts, data['fps'].item(), data['issues'].tolist(),
+                           data['numbers'])
+        except (OSError, ValueError, KeyError):
+            return None
+
 
 class SubtitleParser:
     @staticmethod
     def parse_subtitle_file(file_path):
         """Parse SRT file and return list of (start_time, duration, text)."""
-        subs = pysrt.open(file_path)
+        return SubtitleParser._cues(pysrt.open(file_path))
+
+    @staticmethod
+    def _cues(subs):
         return [(sub.start.ordinal / 1000.0,
                 (sub.end - sub.start).ordinal / 1000.0,
-                sub.text) for sub in subs]
\ No newline at end of file
+                sub.text) for sub in subs]
+
+    @staticmethod
+    def load_timeline(file_path, fps, min_frames=0, cache_dir=None):
+        """Return the normalized SubtitleTimeline of an SRT file.
+
+        With `cache_dir`, the compiled timeline is stored there keyed by the SRT's
+        content hash, fps and `min_frames`, and reused instead of parsing again.
+        """
+        cache_path = None
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+            cache_path = os.path.join(cache_dir, f"{BuildManifest.hash_file(file_path)}_{fps:g}fps_{min_frames}.npz")
+            timeline = SubtitleTimeline.load(cache_path) if os.path.exists(cache_path) else None
+            if timeline is not None:
+                return timeline
+
+        subs = pysrt.open(file_path)
+        timeline = SubtitleTimeline.from_subtitles(SubtitleParser._cues(subs), fps, min_frames,
+                                                   [sub.index for sub in subs])
+        if cache_path:
+            timeline.save(cache_path)
+        return timeline
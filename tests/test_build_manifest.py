@@ -0,0 +1,46 @@
+from build_manifest import BuildManifest
+from main import Config
+
+
+def make_inputs(tmp_path):
+    paths = []
+    for name, content in (('1.png', b'png'), ('1.srt', b'srt'), ('1.wav', b'wav')):
+        path = tmp_path / name
+        path.write_bytes(content)
+        paths.append(str(path))
+    return paths
+
+
+def test_changed_input_makes_job_stale(tmp_path):
+    inputs = make_inputs(tmp_path)
+    config = Config(fps=24, res_x=1920, res_y=1080)
+    output = tmp_path / 'output_1.mp4'
+    output.write_bytes(b'video')
+    manifest_path = str(tmp_path / '.build_manifest.json')
+
+    job_hash = BuildManifest.compute_job_hash(inputs, config)
+    BuildManifest(manifest_path).record(1, job_hash, str(output))
+
+    # A fresh manifest reads the recorded job back from disk
+    manifest = BuildManifest(manifest_path)
+    assert manifest.is_up_to_date(1, BuildManifest.compute_job_hash(inputs, config), str(output))
+
+    (tmp_path / '1.srt').write_bytes(b'edited srt')
+    assert not manifest.is_up_to_date(1, BuildManifest.compute_job_hash(inputs, config), str(output))
+
+
+def test_missing_output_makes_job_stale(tmp_path):
+    inputs = make_inputs(tmp_path)
+    config = Config(fps=24, res_x=1920, res_y=1080)
+    manifest = BuildManifest(str(tmp_path / '.build_manifest.json'))
+    job_hash = BuildManifest.compute_job_hash(inputs, config)
+    manifest.record(1, job_hash, str(tmp_path / 'output_1.mp4'))
+    assert not manifest.is_up_to_date(1, job_hash, str(tmp_path / 'output_1.mp4'))
+
+
+def test_only_output_settings_change_the_hash(tmp_path):
+    inputs = make_inputs(tmp_path)
+    base = BuildManifest.compute_job_hash(inputs, Config(fps=24, res_x=1920, res_y=1080))
+    tuned = Config(fps=24, res_x=1920, res_y=1080, retries=3, job_timeout=600, segments=4, encoder_threads=2)
+    assert BuildManifest.compute_job_hash(inputs, tuned) == base
+    assert BuildManifest.compute_job_hash(inputs, Config(fps=30, res_x=1920, res_y=1080)) != base
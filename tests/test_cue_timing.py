@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from job_manifest import STYLE_PRESETS
+from overlay_renderer import OverlayRenderer
+from subtitle_parser import SubtitleTimeline
+from text_overlay import CueAnimationStore, TextOverlay
+
+FPS = 24
+FONT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'klementin.otf')
+
+
+@pytest.fixture
+def text_overlay():
+    return TextOverlay(FONT_PATH, **STYLE_PRESETS['default'], size_scale=0.1)
+
+
+@pytest.mark.parametrize('total, expected', [(37, (12, 13)), (24, (12, 0)), (12, (6, 0)), (1, (0, 1))])
+def test_cue_sections_fill_every_frame(text_overlay, total, expected):
+    assert text_overlay.cue_sections(total) == expected
+
+
+@pytest.mark.parametrize('cue_store', [None, CueAnimationStore()])
+def test_lazy_overlay_covers_exactly_the_cue_frames(text_overlay, cue_store):
+    # 'a' has no room for full fades before 'b'; 'c' is 37 frames long
+    text_overlay.cue_store = cue_store
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 0.25, 'a'), (0.5, 2.0, 'b'), (3.0, 37 / FPS, 'c')], FPS, 24)
+    renderer = OverlayRenderer(text_overlay, timeline)
+    for frame in range(0, 120):
+        drawn = renderer.render_overlay(frame / FPS) is not None
+        assert drawn == (timeline.cue_at(frame) is not None), frame
+
+
+def test_text_clips_end_with_their_cue(text_overlay):
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 0.25, 'a'), (0.5, 2.0, 'b')], FPS, 24)
+    (a_start, a_length, a_text), (b_start, _, _) = timeline.to_subtitles()
+    clip = text_overlay.create_text_clip(a_text, a_start, a_length, fps=FPS)
+    assert clip.end == pytest.approx(b_start)
+
+
+def test_glyph_cache_stays_within_its_byte_budget():
+    overlay = TextOverlay(FONT_PATH, **STYLE_PRESETS['default'], size_scale=0.25, glyph_cache_bytes=1024 * 1024)
+    for scale in (0.5, 0.6, 0.7, 0.8, 0.9, 1.0):
+        overlay.generate_text_image('a fairly long lyric line to rasterize', scale=scale)
+    used = sum(TextOverlay._image_bytes(image) for image in overlay._glyph_cache.values())
+    assert used == overlay._glyph_cache_used
+    assert used <= 1024 * 1024 or len(overlay._glyph_cache) == 1
@@ -0,0 +1,33 @@
+import pytest
+
+from batch_processor import ParallelBatchProcessor
+from encoder_probe import EncoderProbe
+from main import Config
+
+
+@pytest.fixture
+def processor(tmp_path, monkeypatch):
+    monkeypatch.setattr('os.cpu_count', lambda: 32)
+    return ParallelBatchProcessor(str(tmp_path), str(tmp_path / 'out'), 'font.otf', max_workers=31)
+
+
+def test_small_batch_splits_cores_between_its_tasks(processor):
+    config = Config(fps=24, res_x=64, res_y=64)
+    processor._split_encoder_threads(config, 3)
+    assert config.encoder_threads == 10
+
+
+def test_large_batch_splits_cores_between_workers(processor):
+    config = Config(fps=24, res_x=64, res_y=64)
+    processor._split_encoder_threads(config, 100)
+    assert config.encoder_threads == 1
+
+
+def test_explicit_thread_count_is_kept(processor):
+    config = Config(fps=24, res_x=64, res_y=64, encoder_threads=4)
+    processor._split_encoder_threads(config, 3)
+    assert config.encoder_threads == 4
+
+
+def test_threads_per_worker_never_drops_below_one():
+    assert EncoderProbe.threads_per_worker(64, cpu_count=8) == 1
@@ -0,0 +1,27 @@
+import json
+
+import pytest
+
+from job_manifest import JobManifest
+
+
+def write_manifest(tmp_path, styles):
+    path = tmp_path / 'jobs.json'
+    path.write_text(json.dumps({
+        'styles': styles,
+        'jobs': [{'id': 'a', 'background': 'a.png', 'subtitles': 'a.srt', 'audio': 'a.wav',
+                  'output': 'a.mp4', 'style': 'big'}],
+    }))
+    return str(path)
+
+
+def test_styles_extend_presets(tmp_path):
+    manifest = JobManifest.load(write_manifest(tmp_path, {'big': {'extends': 'dark_shadow', 'font_size': 200}}))
+    assert manifest.styles['big']['font_size'] == 200
+    assert manifest.styles['big']['shadow_color'] == (0, 0, 0)
+    assert manifest.jobs[0].output == str(tmp_path / 'a.mp4')
+
+
+def test_unknown_style_option_is_rejected(tmp_path):
+    with pytest.raises(ValueError, match='font_sise'):
+        JobManifest.load(write_manifest(tmp_path, {'big': {'font_sise': 200}}))
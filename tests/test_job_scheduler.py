@@ -0,0 +1,97 @@
+import os
+import subprocess
+import time
+
+import numpy as np
+import pytest
+
+from job_scheduler import JobScheduler, RenderTask
+from main import Config
+from video_exporter import VideoExporter
+
+
+def flaky_worker(task):
+    """Fails the first time it sees a marker path, then succeeds."""
+    kind, (marker,) = task
+    if not os.path.exists(marker):
+        open(marker, 'w').close()
+        raise RuntimeError('first attempt fails')
+    return 'done'
+
+
+def slow_worker(task):
+    time.sleep(5)
+    return 'done'
+
+
+def run(scheduler, worker, tasks):
+    return list(scheduler.run(worker, tasks, succeeded=lambda result: result == 'done'))
+
+
+def test_failed_task_is_retried(tmp_path):
+    task = RenderTask('video', (str(tmp_path / 'marker'),))
+    [(finished, result, error)] = run(JobScheduler(1, retries=1), flaky_worker, [task])
+    assert (result, error) == ('done', None)
+    assert finished.attempts == 2
+
+
+def test_failure_is_reported_once_retries_run_out(tmp_path):
+    task = RenderTask('video', (str(tmp_path / 'marker'),))
+    [(_, result, error)] = run(JobScheduler(1), flaky_worker, [task])
+    assert result is None and 'first attempt fails' in error
+
+
+def test_slow_task_times_out():
+    [(_, result, error)] = run(JobScheduler(1, timeout=1), slow_worker, [RenderTask('video', ('slow',))])
+    assert result is None and 'time limit' in error
+
+
+class FailingClip:
+    """Stand-in clip whose third frame raises, like a job timeout during rendering."""
+    duration = 1.0
+
+    def get_frame(self, t):
+        if t > 0.05:
+            raise TimeoutError('Job exceeded its time limit')
+        return np.zeros((16, 16, 3), dtype=np.uint8)
+
+
+def test_interrupted_native_export_kills_ffmpeg(tmp_path, monkeypatch):
+    started = []
+    popen = subprocess.Popen
+
+    def recording_popen(*args, **kwargs):
+        started.append(popen(*args, **kwargs))
+        return started[-1]
+
+    monkeypatch.setattr(subprocess, 'Popen', recording_popen)
+    config = Config(fps=24, res_x=16, res_y=16, encoder='libx264', exporter='native')
+    with pytest.raises(TimeoutError):
+        VideoExporter.export_frames(FailingClip(), str(tmp_path / 'out.mp4'), config)
+    assert started and started[0].returncode is not None
+
+
+def test_priority_groups_similar_costs_by_style():
+    tasks = [RenderTask('video', (name,), cost, group=group) for name, cost, group in
+             [('a1', 100.0, 0), ('b1', 110.0, 1), ('a2', 120.0, 0), ('b2', 90.0, 1), ('long', 1000.0, 1)]]
+    order = [task.args[0] for task in sorted(tasks, key=RenderTask.priority)]
+    assert order == ['long', 'a2', 'a1', 'b1', 'b2']
+
+
+def quick_worker(task):
+    kind, (seconds,) = task
+    time.sleep(seconds)
+    return 'done'
+
+
+def test_later_submission_finishes_while_earlier_task_runs():
+    scheduler = JobScheduler(2, keep_workers=True)
+    try:
+        scheduler.submit(quick_worker, [RenderTask('video', (3,))], succeeded=lambda result: result == 'done')
+        assert scheduler.collect(timeout=0.1) == []
+        scheduler.submit(quick_worker, [RenderTask('video', (0,))], succeeded=lambda result: result == 'done')
+        [(finished, result, error)] = scheduler.collect(timeout=2)
+        assert finished.args == (0,) and result == 'done'
+        assert scheduler.busy
+    finally:
+        scheduler.close()
@@ -0,0 +1,26 @@
+import numpy as np
+
+from overlay_renderer import OverlayRenderer
+
+
+def test_overlay_rect_centres_and_clips():
+    assert OverlayRenderer.overlay_rect((100, 200, 3), (20, 40, 4)) == (80, 40, 80, 40, 120, 60)
+    assert OverlayRenderer.overlay_rect((10, 10, 3), (20, 40, 4)) == (-15, -5, 0, 0, 10, 10)
+
+
+def test_blend_matches_float_alpha_compositing():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 256, (30, 40, 3), dtype=np.uint8)
+    overlay = rng.integers(0, 256, (10, 20, 4), dtype=np.uint8)
+    expected = frame.astype(np.float64)
+    rect = OverlayRenderer.overlay_rect(frame.shape, overlay.shape)
+    x, y, x1, y1, x2, y2 = rect
+    alpha = overlay[:, :, 3:4] / 255.0
+    expected[y1:y2, x1:x2] = overlay[:, :, :3] * alpha + expected[y1:y2, x1:x2] * (1 - alpha)
+
+    renderer = OverlayRenderer.__new__(OverlayRenderer)
+    renderer.scratch = np.empty(0, dtype=np.uint16)
+    result = renderer.blend(frame, overlay, rect)
+
+    assert result is frame
+    assert np.abs(result.astype(np.int16) - np.rint(expected)).max() <= 1
@@ -0,0 +1,32 @@
+from video_generator import VideoGenerator
+
+FPS = 24
+
+
+def test_short_song_is_not_split():
+    assert VideoGenerator.plan_segments([], 15.0, 4, FPS) == [(0.0, 15.0)]
+
+
+def test_segments_cover_the_song_without_gaps():
+    segments = VideoGenerator.plan_segments([], 100.0, 4, FPS)
+    assert len(segments) == 4
+    assert segments[0][0] == 0.0 and segments[-1][1] == 100.0
+    assert all(end == next_start for (_, end), (next_start, _) in zip(segments, segments[1:]))
+
+
+def test_cut_moves_into_the_gap_between_cues():
+    # The halfway target (50 s) lies inside the second cue; the gap between the cues is at 46 s
+    subtitles = [(0.0, 45.5, 'a'), (46.5, 53.5, 'b')]
+    assert VideoGenerator.plan_segments(subtitles, 100.0, 2, FPS) == [(0.0, 46.0), (46.0, 100.0)]
+
+
+def test_cut_falls_back_to_a_cue_start():
+    subtitles = [(0.0, 48.0, 'a'), (47.0, 53.0, 'b')]
+    assert VideoGenerator.plan_segments(subtitles, 100.0, 2, FPS) == [(0.0, 47.0), (47.0, 100.0)]
+
+
+def test_cuts_are_frame_aligned():
+    subtitles = [(0.3, 40.0, 'a'), (41.7, 40.0, 'b')]
+    for start, end in VideoGenerator.plan_segments(subtitles, 90.0, 3, FPS):
+        assert abs(start * FPS - round(start * FPS)) < 1e-9
+        assert abs(end * FPS - round(end * FPS)) < 1e-9 or end == 90.0
@@ -0,0 +1,82 @@
+import pytest
+
+from subtitle_parser import SubtitleParser, SubtitleTimeline
+from video_generator import VideoGenerator
+
+FPS = 24
+
+
+def frames(timeline):
+    return list(zip(timeline.starts.tolist(), timeline.ends.tolist()))
+
+
+def test_out_of_order_cues_are_sorted_and_keep_their_numbers():
+    timeline = SubtitleTimeline.from_subtitles([(2.0, 1.0, 'b'), (0.0, 1.0, 'a')], FPS)
+    assert timeline.texts == ['a', 'b']
+    assert frames(timeline) == [(0, 24), (48, 72)]
+    assert timeline.numbers.tolist() == [2, 1]
+
+
+def test_overlapping_cue_is_cut_at_next_start():
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 2.0, 'a'), (1.0, 2.0, 'b')], FPS)
+    assert frames(timeline) == [(0, 24), (24, 72)]
+    assert any('overlaps' in issue for issue in timeline.issues)
+
+
+def test_short_cue_is_extended_up_to_next_cue():
+    # Room for a 12-frame fade in and out is 24 frames
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 0.25, 'a'), (0.5, 0.25, 'b'), (5.0, 0.25, 'c')], FPS, 24)
+    assert frames(timeline) == [(0, 12), (12, 36), (120, 144)]
+
+
+def test_empty_and_zero_length_cues_are_dropped():
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 1.0, ' '), (1.0, 0.0, 'a'), (2.0, 1.0, 'b')], FPS)
+    assert timeline.texts == ['b']
+    assert timeline.numbers.tolist() == [3]
+    assert len(timeline.issues) == 2
+
+
+def test_cue_at_uses_half_open_frame_ranges():
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 1.0, 'a'), (2.0, 1.0, 'b')], FPS)
+    assert timeline.cue_at(0) == 0
+    assert timeline.cue_at(23) == 0
+    assert timeline.cue_at(24) is None
+    assert timeline.cue_at(48) == 1
+    assert timeline.cue_at(72) is None
+
+
+def test_save_and_load_round_trip(tmp_path):
+    timeline = SubtitleTimeline.from_subtitles([(1.0, 1.0, 'zwei'), (0.0, 1.0, 'einé')], FPS)
+    path = str(tmp_path / 'timeline.npz')
+    timeline.save(path)
+    loaded = SubtitleTimeline.load(path)
+    assert loaded.texts == timeline.texts
+    assert frames(loaded) == frames(timeline)
+    assert loaded.numbers.tolist() == timeline.numbers.tolist()
+    assert loaded.fps == FPS
+
+
+def test_load_timeline_keeps_srt_indices(tmp_path):
+    srt = tmp_path / 'song.srt'
+    srt.write_text('7\n00:00:03,000 --> 00:00:04,000\nlater\n\n'
+                   '3\n00:00:00,000 --> 00:00:01,000\nfirst\n')
+    timeline = SubtitleParser.load_timeline(str(srt), FPS, cache_dir=str(tmp_path / 'cache'))
+    assert timeline.texts == ['first', 'later']
+    assert timeline.numbers.tolist() == [3, 7]
+
+
+def test_preview_ranges_resolve_srt_numbers_after_normalization():
+    # Cue 1 is empty and dropped; cue 3 comes first in time
+    timeline = SubtitleTimeline.from_subtitles(
+        [(0.0, 1.0, ''), (10.0, 1.0, 'b'), (2.0, 1.0, 'c')], FPS)
+    assert VideoGenerator.preview_ranges(timeline, [2], 30.0, padding=1.0) == [(9.0, 12.0)]
+    assert VideoGenerator.preview_ranges(timeline, [3, 2], 30.0, padding=1.0) == [(1.0, 4.0), (9.0, 12.0)]
+    assert VideoGenerator.preview_ranges(timeline, [3, 2], 30.0, padding=4.0) == [(0.0, 15.0)]
+    with pytest.raises(ValueError):
+        VideoGenerator.preview_ranges(timeline, [1], 30.0)
+
+
+def test_short_cue_without_room_is_logged_as_unresolved():
+    timeline = SubtitleTimeline.from_subtitles([(0.0, 0.25, 'a'), (0.5, 2.0, 'b')], FPS, 24)
+    assert frames(timeline) == [(0, 12), (12, 60)]
+    assert 'no room' in timeline.issues[0] and 'extended' not in timeline.issues[0]
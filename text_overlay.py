@@ -1,11 +1,72 @@
 from PIL import Image, ImageDraw, ImageFont, ImageFilter
 import numpy as np
 from moviepy.editor import ImageClip, ImageSequenceClip, concatenate_videoclips
-import math
 import logging
+from collections import OrderedDict
+from functools import lru_cache
+import animation_timeline
+from background_animator import RESAMPLING
+from render_profiler import PROFILER
+
+logger = logging.getLogger(__name__)
+
+
+class CueAnimationStore:
+    def __init__(self, max_bytes=128 * 1024 * 1024):
+        """Rendered cue frame sequences shared by every TextOverlay in a worker process.
+
+        Entries are keyed by style and text (plus the frame count for main sequences)
+        and evicted least-recently-used first once they hold more than `max_bytes`.
+        Worker processes stay alive for a whole batch, so songs with the same style
+        reuse each other's repeated lines.
+        """
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries = OrderedDict()
+
+    @staticmethod
+    def _frames_bytes(frames):
+        # Held frames repeat the same array for identical (opacity, scale) pairs
+        return sum(frame.nbytes for frame in {id(frame): frame for frame in frames}.values())
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, frames):
+        if key in self._entries:
+            return
+        size = self._frames_bytes(frames)
+        self._entries[key] = (frames, size)
+        self.size_bytes += size
+        self._evict()
+
+    def resize(self, max_bytes):
+        """Change the size limit, evicting entries that no longer fit."""
+        self.max_bytes = max_bytes
+        self._evict()
+
+    def _evict(self):
+        while self.size_bytes > self.max_bytes and len(self._entries) > 1:
+            _, (_, evicted_size) = self._entries.popitem(last=False)
+            self.size_bytes -= evicted_size
+
+    def clear(self):
+        self._entries.clear()
+        self.size_bytes = 0
+
+
+CUE_STORE = CueAnimationStore()
+
+
+@lru_cache(maxsize=256)
+def load_font(font_path, size):
+    """Load a font at `size` once per process; worker processes keep fonts warm across videos."""
+    return ImageFont.truetype(font_path, size)
 
-# Setup logging
-logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(message)s')
 
 class TextOverlay:
     def __init__(self, font_path, font_size=40, font_color=(255, 255, 255),
@@ -13,17 +74,30 @@ class TextOverlay:
                  shadow_opacity=0.5, resolution_scale=4, fade_frames=12,
                  fade_in_start_scale=3, fade_in_end_scale=1.0,
                  main_start_scale=1.0, main_end_scale=0.95,
-                 fade_out_start_scale=0.95, fade_out_end_scale=0.2):
-        logging.debug(f"Initializing TextOverlay with font: {font_path}")
+                 fade_out_start_scale=0.95, fade_out_end_scale=0.2,
+                 glyph_cache_size=256, scale_quantum=0.002,
+                 fade_opacity_easing='ease_in_out_expo', fade_in_scale_easing='ease_out_expo',
+                 fade_out_scale_easing='ease_in_expo', main_scale_easing='linear',
+                 size_scale=1.0, resample='lanczos', shadow_blur='gaussian', cue_store=None,
+                 glyph_cache_bytes=64 * 1024 * 1024):
+        logger.debug("Initializing TextOverlay with font: %s", font_path)
         self.font_size = font_size
-        self.font = ImageFont.truetype(font_path, font_size * resolution_scale)
+        self.font = load_font(font_path, font_size * resolution_scale)
         self.font_color = font_color
         self.shadow_color = (*shadow_color, int(255 * shadow_opacity))
-        self.shadow_offset = tuple(i * resolution_scale for i in shadow_offset)
-        self.shadow_spread = shadow_spread * resolution_scale
+        self.shadow_offset = tuple(i * resolution_scale * size_scale for i in shadow_offset)
+        self.shadow_spread = shadow_spread * resolution_scale * size_scale
         self.resolution_scale = resolution_scale
         self.fade_frames = fade_frames
 
+        # Preview quality knobs: text size relative to the 1080p layout, the filter used to
+        # downsample rasters, and the shadow blur ('gaussian', the cheaper 'box', or 'none')
+        if shadow_blur not in ('gaussian', 'box', 'none'):
+            raise ValueError(f"Unknown shadow blur: {shadow_blur}")
+        self.size_scale = size_scale
+        self.resample = RESAMPLING[resample]
+        self.shadow_blur = shadow_blur
+
         # Store scaling parameters
         self.fade_in_start_scale = fade_in_start_scale
         self.fade_in_end_scale = fade_in_end_scale
@@ -32,10 +106,44 @@ class TextOverlay:
         self.fade_out_start_scale = fade_out_start_scale
         self.fade_out_end_scale = fade_out_end_scale
 
+        # Vectorized easing curves, given by name or as callables
+        self.fade_opacity_easing = animation_timeline.get_easing(fade_opacity_easing)
+        self.fade_in_scale_easing = animation_timeline.get_easing(fade_in_scale_easing)
+        self.fade_out_scale_easing = animation_timeline.get_easing(fade_out_scale_easing)
+        self.main_scale_easing = animation_timeline.get_easing(main_scale_easing)
+
         self.frame_size = None
 
+        # Raster cache: full-opacity glyph images per (text, frame size, quantized scale),
+        # evicted least-recently-used first once it holds more than `glyph_cache_size` images
+        # or `glyph_cache_bytes` of pixels. Frames are sized for the largest fade-in scale,
+        # so a single long line can take several megabytes.
+        self.glyph_cache_size = glyph_cache_size
+        self.glyph_cache_bytes = glyph_cache_bytes
+        self.scale_quantum = scale_quantum
+        self._glyph_cache = OrderedDict()
+        self._glyph_cache_used = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+        # Rendered cue sequences are shared between overlays whose parameters all match;
+        # pass a CueAnimationStore (normally CUE_STORE) to enable it
+        self.cue_store = cue_store
+        self.style_key = (font_path, font_size, resolution_scale, self.font_color, self.shadow_color,
+                          self.shadow_offset, self.shadow_spread, fade_frames,
+                          fade_in_start_scale, fade_in_end_scale, main_start_scale, main_end_scale,
+                          fade_out_start_scale, fade_out_end_scale,
+                          self.fade_opacity_easing, self.fade_in_scale_easing,
+                          self.fade_out_scale_easing, self.main_scale_easing,
+                          scale_quantum if glyph_cache_size > 0 else 0.0,
+                          size_scale, self.resample, shadow_blur)
+
+    def _get_font(self, size):
+        """Return the font loaded at `size`, loading it only once."""
+        return load_font(self.font.path, size)
+
     def _calculate_base_size(self, text):
-        logging.debug(f"Calculating base size for text: {text}")
+        logger.debug("Calculating base size for text: %s", text)
         max_scale = max(self.fade_in_start_scale, self.fade_in_end_scale,
                         self.main_start_scale, self.main_end_scale,
                         self.fade_out_start_scale, self.fade_out_end_scale)
@@ -44,8 +152,7 @@ class TextOverlay:
         min_font_size = 60
         scale_factor = 0.5
         dynamic_font_size = max(min_font_size, max_font_size - int(len(text) * scale_factor))
-        high_res_font = ImageFont.truetype(self.font.path,
-                                           int(dynamic_font_size * self.resolution_scale * max_scale))
+        high_res_font = self._get_font(int(dynamic_font_size * self.resolution_scale * self.size_scale * max_scale))
 
         temp_img = Image.new('RGBA', (1, 1))
         temp_draw = ImageDraw.Draw(temp_img)
@@ -57,14 +164,60 @@ class TextOverlay:
 
         self.frame_size = (width // self.resolution_scale,
                            height // self.resolution_scale)
-        logging.debug(f"Calculated frame size: {self.frame_size}")
+        logger.debug("Calculated frame size: %s", self.frame_size)
         return width, height
 
     def generate_text_image(self, text, opacity=1.0, scale=1.0):
-        logging.debug(f"Generating text image for: {text} with opacity: {opacity} and scale: {scale}")
+        """Return the RGBA text image for `text`, using the raster cache when enabled.
+
+        Cached images are rendered at full opacity and faded with an alpha multiply.
+        The returned image may be shared with the cache and must not be modified.
+        """
         if self.frame_size is None:
             self._calculate_base_size(text)
 
+        if self.glyph_cache_size <= 0:
+            with PROFILER.timer('text_render'):
+                return self._render_text_image(text, opacity, scale)
+
+        if self.scale_quantum:
+            scale = round(scale / self.scale_quantum) * self.scale_quantum
+
+        key = (text, self.frame_size, scale)
+        image = self._glyph_cache.get(key)
+        if image is not None:
+            self._glyph_cache.move_to_end(key)
+            self.cache_hits += 1
+            PROFILER.count('glyph_cache_hits')
+        else:
+            with PROFILER.timer('text_render'):
+                image = self._render_text_image(text, 1.0, scale)
+            self._glyph_cache[key] = image
+            self._glyph_cache_used += self._image_bytes(image)
+            while len(self._glyph_cache) > 1 and (len(self._glyph_cache) > self.glyph_cache_size or
+                                                  self._glyph_cache_used > self.glyph_cache_bytes):
+                _, evicted = self._glyph_cache.popitem(last=False)
+                self._glyph_cache_used -= self._image_bytes(evicted)
+            self.cache_misses += 1
+            PROFILER.count('glyph_cache_misses')
+
+        return self._apply_opacity(image, opacity)
+
+    @staticmethod
+    def _image_bytes(image):
+        return image.width * image.height * len(image.getbands())
+
+    @staticmethod
+    def _apply_opacity(image, opacity):
+        """Scale the alpha channel of a full-opacity RGBA image by `opacity`."""
+        if opacity >= 1.0:
+            return image
+        faded = image.copy()
+        faded.putalpha(image.getchannel('A').point(lambda a: int(a * opacity)))
+        return faded
+
+    def _render_text_image(self, text, opacity, scale):
+        """Rasterize the shadowed text at `scale` and `opacity` into a frame-sized image."""
         high_res_size = (self.frame_size[0] * self.resolution_scale,
                          self.frame_size[1] * self.resolution_scale)
 
@@ -75,8 +228,8 @@ class TextOverlay:
         min_font_size = 60
         scale_factor = 0.5
         dynamic_font_size = max(min_font_size, max_font_size - int(len(text) * scale_factor))
-        scaled_font_size = int(dynamic_font_size * self.resolution_scale * scale)
-        scaled_font = ImageFont.truetype(self.font.path, scaled_font_size)
+        scaled_font_size = max(1, int(dynamic_font_size * self.resolution_scale * self.size_scale * scale))
+        scaled_font = self._get_font(scaled_font_size)
 
         temp_draw = ImageDraw.Draw(shadow_img)
         text_bbox = temp_draw.textbbox((0, 0), text, font=scaled_font)
@@ -89,106 +242,151 @@ class TextOverlay:
         shadow_color = (*self.shadow_color[:3], int(self.shadow_color[3] * opacity))
         font_color = (*self.font_color[:3], int(255 * opacity))
 
-        shadow_draw = ImageDraw.Draw(shadow_img)
-        shadow_pos = (x + int(self.shadow_offset[0] * scale),
-                      y + int(self.shadow_offset[1] * scale))
-        shadow_draw.text(shadow_pos, text, font=scaled_font, fill=shadow_color)
-
-        shadow_img = shadow_img.filter(
-            ImageFilter.GaussianBlur(radius=self.shadow_spread * scale))
-
         text_draw = ImageDraw.Draw(text_img)
         text_draw.text((x, y), text, font=scaled_font, fill=font_color)
 
-        final_img = Image.alpha_composite(shadow_img, text_img)
-
-        final_img = final_img.resize(self.frame_size, Image.Resampling.LANCZOS)
-        return final_img
-
-    def _generate_fade_sequence(self, text, fade_in=True):
-        logging.debug(f"Generating fade sequence for text: {text} (fade_in={fade_in})")
-        frames = []
-        for i in range(self.fade_frames):
-            progress = i / (self.fade_frames - 1)
+        if self.shadow_blur == 'none':
+            final_img = text_img
+        else:
+            shadow_draw = ImageDraw.Draw(shadow_img)
+            shadow_pos = (x + int(self.shadow_offset[0] * scale),
+                          y + int(self.shadow_offset[1] * scale))
+            shadow_draw.text(shadow_pos, text, font=scaled_font, fill=shadow_color)
 
-            if fade_in:
-                opacity = progress
+            if self.shadow_blur == 'box':
+                shadow_filter = ImageFilter.BoxBlur(radius=self.shadow_spread * scale)
             else:
-                opacity = 1 - progress
-            opacity = self._ease_in_out(opacity)
+                shadow_filter = ImageFilter.GaussianBlur(radius=self.shadow_spread * scale)
+            shadow_img = shadow_img.filter(shadow_filter)
 
-            if fade_in:
-                scale = self._lerp(self.fade_in_start_scale,
-                                   self.fade_in_end_scale,
-                                   self._ease_out_expo(progress))
-            else:
-                scale = self._lerp(self.fade_out_start_scale,
-                                   self.fade_out_end_scale,
-                                   self._ease_in_expo(progress))
+            final_img = Image.alpha_composite(shadow_img, text_img)
 
-            frames.append(np.array(self.generate_text_image(text,
-                                                            opacity=opacity,
-                                                            scale=scale)))
-        return frames
-
-    def _generate_main_sequence(self, text, duration, fps):
-        logging.debug(f"Generating main sequence for text: {text} with duration: {duration}, fps: {fps}")
-        frames = []
-        total_frames = int(duration * fps)
-
-        for i in range(total_frames):
-            progress = i / max(1, total_frames - 1)
-            # Direct linear scaling without easing
-            scale = self.main_start_scale + (self.main_end_scale - self.main_start_scale) * progress
-
-            frames.append(np.array(self.generate_text_image(text,
-                                                        opacity=1.0,
-                                                        scale=scale)))
-        return frames
+        final_img = final_img.resize(self.frame_size, self.resample)
+        return final_img
 
-    def _lerp(self, start, end, progress):
-        return start + (end - start) * progress
+    def _fade_curves(self, fade_in=True, fade_frames=None):
+        """Return (opacity, scale) arrays for every frame of a fade-in or fade-out."""
+        progress = animation_timeline.frame_progress(self.fade_frames if fade_frames is None else fade_frames)
 
-    def _ease_in_out(self, x):
-        if x < 0.5:
-            return math.pow(2, 20 * x - 10) / 2
+        if fade_in:
+            opacity = self.fade_opacity_easing(progress)
+            scale = animation_timeline.keyframe_curve(progress, self.fade_in_start_scale,
+                                                      self.fade_in_end_scale, self.fade_in_scale_easing)
         else:
-            return (2 - math.pow(2, -20 * x + 10)) / 2
-
-    def _ease_out_expo(self, x):
-        return 1 - math.pow(2, -8 * x)
+            opacity = self.fade_opacity_easing(1 - progress)
+            scale = animation_timeline.keyframe_curve(progress, self.fade_out_start_scale,
+                                                      self.fade_out_end_scale, self.fade_out_scale_easing)
+        return opacity, scale
+
+    def _main_curves(self, total_frames):
+        """Return (opacity, scale) arrays for every frame of the main sequence."""
+        progress = animation_timeline.frame_progress(total_frames)
+        scale = animation_timeline.keyframe_curve(progress, self.main_start_scale,
+                                                  self.main_end_scale, self.main_scale_easing)
+        return np.ones(total_frames), scale
+
+    def cue_sections(self, total_frames):
+        """Return (fade_frames, main_frames) for a cue shown on `total_frames` whole frames.
+
+        Cues too short for two full fades get shorter fades, so the animation always
+        ends on the cue's last frame.
+        """
+        fade_frames = min(self.fade_frames, total_frames // 2)
+        return fade_frames, total_frames - 2 * fade_frames
+
+    def cue_curves(self, main_frames, fade_frames=None):
+        """Return (opacity, scale) arrays covering fade-in, main and fade-out of one cue."""
+        curves = [self._fade_curves(fade_in=True, fade_frames=fade_frames), self._main_curves(main_frames),
+                  self._fade_curves(fade_in=False, fade_frames=fade_frames)]
+        return (np.concatenate([opacity for opacity, _ in curves]),
+                np.concatenate([scale for _, scale in curves]))
+
+    def _render_sequence(self, text, opacity, scale):
+        """Render frames for the given curves, rasterizing each distinct (opacity, scale) once."""
+        # Scales are only quantized when the raster cache would quantize them anyway
+        scale_quantum = self.scale_quantum if self.glyph_cache_size > 0 else 0.0
+        unique, inverse = animation_timeline.unique_params(opacity, scale, scale_quantum)
+        images = [np.array(self.generate_text_image(text, opacity=float(pair_opacity), scale=float(pair_scale)))
+                  for pair_opacity, pair_scale in unique]
+        return [images[i] for i in inverse]
+
+    def _generate_fade_sequence(self, text, fade_in=True, fade_frames=None):
+        logger.debug("Generating fade sequence for text: %s (fade_in=%s)", text, fade_in)
+        opacity, scale = self._fade_curves(fade_in=fade_in, fade_frames=fade_frames)
+        return self._render_sequence(text, opacity, scale)
 
-    def _ease_in_expo(self, x):
-        return math.pow(2, 8 * x - 8)
-
-    def _ease_in_out_cubic(self, x):
-        if x < 0.5:
-            return 4 * x * x * x
-        else:
-            return 1 - math.pow(-2 * x + 2, 3) / 2
+    def _generate_main_sequence(self, text, duration, fps):
+        logger.debug("Generating main sequence for text: %s with duration: %s, fps: %s", text, duration, fps)
+        opacity, scale = self._main_curves(int(duration * fps))
+        return self._render_sequence(text, opacity, scale)
+
+    def _stored_sequence(self, key, render):
+        """Return the frames for `key` from the cue store, rendering them on a miss."""
+        if self.cue_store is None:
+            return render()
+
+        key = (self.style_key,) + key
+        frames = self.cue_store.get(key)
+        if frames is not None:
+            PROFILER.count('cue_store_hits')
+            return frames
+
+        PROFILER.count('cue_store_misses')
+        frames = render()
+        self.cue_store.put(key, frames)
+        return frames
 
-    def create_text_clip(self, text, start, duration, fps=30, position='center'):
-        logging.debug(f"Creating text clip for text: {text} at start: {start}, duration: {duration}, fps: {fps}")
+    def _cue_keys(self, text, main_frames, fade_frames=None):
+        # Full-length fades keep the short key; shortened fades are told apart by length
+        fade = () if fade_frames in (None, self.fade_frames) else (fade_frames,)
+        return ('fade_in', text) + fade, ('main', text, main_frames), ('fade_out', text) + fade
+
+    def stored_cue_frames(self, text, main_frames, fade_frames=None):
+        """Return the [fade_in, main, fade_out] frame lists already in the cue store, None for missing ones.
+
+        Nothing is rendered; the lazy overlay renderer fills gaps frame by frame and
+        hands completed sections back with `store_cue_frames`.
+        """
+        if self.cue_store is None:
+            return [None, None, None]
+        sections = [self.cue_store.get((self.style_key,) + key)
+                    for key in self._cue_keys(text, main_frames, fade_frames)]
+        for frames in sections:
+            PROFILER.count('cue_store_misses' if frames is None else 'cue_store_hits')
+        return sections
+
+    def store_cue_frames(self, text, main_frames, section, frames, fade_frames=None):
+        """Add one completed section (0 fade-in, 1 main, 2 fade-out) of a cue to the cue store."""
+        if self.cue_store is not None:
+            self.cue_store.put((self.style_key,) + self._cue_keys(text, main_frames, fade_frames)[section], frames)
+
+    def cue_frames(self, text, main_frames, fade_frames=None):
+        """Return the (fade_in, main, fade_out) RGBA frame lists of a cue.
+
+        Fades do not depend on the cue length, so repeats of a line reuse them even
+        when their lengths differ; main sequences are reused for equal frame counts.
+        The returned frames may be shared and must not be modified.
+        """
         self._calculate_base_size(text)
+        fade_in_key, main_key, fade_out_key = self._cue_keys(text, main_frames, fade_frames)
+        fade_in = self._stored_sequence(fade_in_key, lambda: self._generate_fade_sequence(text, True, fade_frames))
+        main = self._stored_sequence(main_key, lambda: self._render_sequence(text, *self._main_curves(main_frames)))
+        fade_out = self._stored_sequence(fade_out_key, lambda: self._generate_fade_sequence(text, False, fade_frames))
+        return fade_in, main, fade_out
 
-        fade_duration = self.fade_frames / fps
-        main_duration = max(0, duration - 2 * fade_duration)
-
-        fade_in_frames = self._generate_fade_sequence(text, fade_in=True)
-        main_frames = self._generate_main_sequence(text, main_duration, fps)
-        fade_out_frames = self._generate_fade_sequence(text, fade_in=False)
+    def create_text_clip(self, text, start, duration, fps=30, position='center'):
+        logger.debug("Creating text clip for text: %s at start: %s, duration: %s, fps: %s", text, start, duration, fps)
 
-        fade_in_clip = ImageSequenceClip(fade_in_frames, fps=fps).set_duration(fade_duration)
-        main_clip = ImageSequenceClip(main_frames, fps=fps).set_duration(main_duration)
-        fade_out_clip = ImageSequenceClip(fade_out_frames, fps=fps).set_duration(fade_duration)
+        # Work in whole frames so the clip ends exactly where the cue does
+        fade_count, main_count = self.cue_sections(max(1, int(round(duration * fps))))
+        sections = self.cue_frames(text, main_count, fade_count)
 
-        clips = [fade_in_clip]
-        if main_duration > 0:
-            clips.append(main_clip)
-        clips.append(fade_out_clip)
+        # Sections without frames (no main part, or no room for fades) are left out
+        clips = [ImageSequenceClip(frames, fps=fps).set_duration(len(frames) / fps)
+                 for frames in sections if frames]
 
         final_clip = concatenate_videoclips(clips)
         final_clip = final_clip.set_start(start).set_position(position)
 
-        logging.debug(f"Text clip created successfully.")
+        logger.debug("Text clip created successfully.")
         return final_clip
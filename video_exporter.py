@@ -1,18 +1,175 @@
+import math
+import os
+import subprocess
+import time
+import numpy as np
+from moviepy.config import get_setting
+from render_profiler import PROFILER
+from encoder_probe import EncoderProbe
+
+
 class VideoExporter:
     @staticmethod
-    def export_video(video_clip, output_path, config):
-        """Export the final video clip to MP4 format using NVENC for video encoding and AAC for audio."""
+    def export_video(video_clip, output_path, config, audio_path=None, audio_ranges=None):
+        """Export the final video clip to MP4 format with the configured video encoder and AAC audio.
+
+        The encoder comes from `EncoderProbe`: NVENC/VAAPI when usable, a CPU encoder otherwise.
+
+        With `config.exporter == 'native'` frames are streamed straight to an ffmpeg
+        process instead, and `audio_path` is muxed in by that same process, cut to the
+        (start, end) `audio_ranges` when the clip only covers parts of the song.
+        """
+        if config.exporter == 'native':
+            return VideoExporter.export_frames(video_clip, output_path, config, audio_path, audio_ranges)
+
         try:
-            print(f"x : {config.res_x}, y : {config.res_y}, fps: {config.fps}")
-            video_clip.write_videofile(
-                output_path,
-                fps=config.fps,
-                codec='libx264',
-                audio_codec='aac',
-                threads=1,
-                preset='fast',
-                ffmpeg_params=['-vf', f'scale={config.res_x}:{config.res_y}', '-c:v', 'h264_nvenc', '-c:a', 'aac']  # Scale to 2K
-            )
+            encoder = EncoderProbe.for_config(config)
+            print(f"x : {config.res_x}, y : {config.res_y}, fps: {config.fps}, encoder: {encoder.encoder}")
+            start_time = time.perf_counter()
+            with PROFILER.timer('export'):
+                video_clip.write_videofile(
+                    output_path,
+                    fps=config.fps,
+                    codec=encoder.encoder,
+                    audio_codec='aac',
+                    preset=config.encoder_preset,
+                    # Encoder options follow MoviePy's own and take precedence over them
+                    ffmpeg_params=encoder.global_args +
+                                  ['-vf', ','.join([f'scale={config.res_x}:{config.res_y}'] + encoder.filters)] +
+                                  encoder.output_args + ['-c:a', 'aac']
+                )
+            PROFILER.count('frames', math.ceil(video_clip.duration * config.fps - 1e-6))
+            VideoExporter._report_speed('moviepy', video_clip.duration, config.fps, start_time)
         except Exception as e:
             print(f"Error during video export: {str(e)}")
-            raise
\ No newline at end of file
+            raise
+
+    @staticmethod
+    def export_frames(video_clip, output_path, config, audio_path=None, audio_ranges=None):
+        """Stream raw RGB frames of `video_clip` to an ffmpeg video encoder."""
+        width, height = config.res_x, config.res_y
+        frame_count = math.ceil(video_clip.duration * config.fps - 1e-6)
+        encoder = EncoderProbe.for_config(config)
+
+        command = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error'] + encoder.global_args + [
+            '-f', 'rawvideo', '-pix_fmt', 'rgb24', '-s', f'{width}x{height}', '-r', str(config.fps),
+            '-i', '-'
+        ]
+        if audio_path and audio_ranges:
+            # Trim each range out of the song and join them to match the cut video
+            trims = ''.join(f"[1:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{index}];"
+                            for index, (start, end) in enumerate(audio_ranges))
+            inputs = ''.join(f"[a{index}]" for index in range(len(audio_ranges)))
+            command += ['-i', audio_path, '-filter_complex',
+                        f"{trims}{inputs}concat=n={len(audio_ranges)}:v=0:a=1[audio]",
+                        '-map', '0:v:0', '-map', '[audio]']
+        elif audio_path:
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0']
+        if encoder.filters:
+            command += ['-vf', ','.join(encoder.filters)]
+        command += encoder.output_args
+        if audio_path:
+            command += ['-c:a', 'aac', '-shortest']
+        command.append(output_path)
+
+        try:
+            print(f"x : {width}, y : {height}, fps: {config.fps}, encoder: {encoder.encoder}")
+            start_time = time.perf_counter()
+
+            process = subprocess.Popen(command, stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+            try:
+                # Frames are copied into one preallocated buffer before being written to the pipe
+                buffer = np.empty((height, width, 3), dtype=np.uint8)
+                try:
+                    for index in range(frame_count):
+                        with PROFILER.timer('frame_render'):
+                            np.copyto(buffer, video_clip.get_frame(index / config.fps), casting='unsafe')
+                        with PROFILER.timer('encode'):
+                            process.stdin.write(buffer)
+                        PROFILER.count('frames')
+                except BrokenPipeError:
+                    pass
+                finally:
+                    process.stdin.close()
+
+                error_output = process.stderr.read().decode(errors='replace')
+                if process.wait() != 0:
+                    raise IOError(f"ffmpeg failed while writing {output_path}: {error_output.strip()}")
+            except BaseException:
+                # A render error or job timeout (SIGALRM) must not leave ffmpeg writing a file
+                # the caller is about to delete
+                process.kill()
+                process.wait()
+                raise
+
+            VideoExporter._report_speed('native', video_clip.duration, config.fps, start_time)
+        except Exception as e:
+            print(f"Error during video export: {str(e)}")
+            raise
+
+    @staticmethod
+    def concat_segments(segment_paths, output_path, audio_path=None, audio_codec='aac'):
+        """Join identically encoded video segments without re-encoding and mux the audio.
+
+        Pass `audio_codec='copy'` when `audio_path` is already MP4-compatible.
+        """
+        list_path = f"{output_path}.segments.txt"
+        with open(list_path, 'w') as f:
+            for path in segment_paths:
+                escaped = os.path.abspath(path).replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        command = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+                   '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            # No -shortest: with stream copy it cuts the video back to the previous keyframe
+            command += ['-i', audio_path, '-map', '0:v:0', '-map', '1:a:0', '-c:a', audio_codec]
+        command += ['-c:v', 'copy', output_path]
+
+        try:
+            result = subprocess.run(command, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise IOError(f"ffmpeg failed while joining {output_path}: "
+                              f"{result.stderr.decode(errors='replace').strip()}")
+        except Exception as e:
+            print(f"Error during segment concatenation: {str(e)}")
+            raise
+        finally:
+            os.remove(list_path)
+
+    @staticmethod
+    def mux_audio(video_path, audio_path, output_path, audio_ranges=None):
+        """Mux `audio_path` into a silent video without re-encoding either stream.
+
+        With `audio_ranges`, the audio is cut to those (start, end) ranges and joined,
+        which needs an AAC re-encode of the (short) result.
+        """
+        command = [get_setting("FFMPEG_BINARY"), '-y', '-loglevel', 'error',
+                   '-i', video_path, '-i', audio_path]
+        if audio_ranges:
+            trims = ''.join(f"[1:a]atrim=start={start}:end={end},asetpts=PTS-STARTPTS[a{index}];"
+                            for index, (start, end) in enumerate(audio_ranges))
+            inputs = ''.join(f"[a{index}]" for index in range(len(audio_ranges)))
+            command += ['-filter_complex', f"{trims}{inputs}concat=n={len(audio_ranges)}:v=0:a=1[audio]",
+                        '-map', '0:v:0', '-map', '[audio]', '-c:a', 'aac']
+        else:
+            command += ['-map', '0:v:0', '-map', '1:a:0', '-c:a', 'copy']
+        # No -shortest: with stream copy it cuts the video back to the previous keyframe
+        command += ['-c:v', 'copy', output_path]
+
+        try:
+            with PROFILER.timer('mux'):
+                result = subprocess.run(command, stderr=subprocess.PIPE)
+            if result.returncode != 0:
+                raise IOError(f"ffmpeg failed while muxing {output_path}: "
+                              f"{result.stderr.decode(errors='replace').strip()}")
+        except Exception as e:
+            print(f"Error during audio muxing: {str(e)}")
+            raise
+
+    @staticmethod
+    def _report_speed(exporter, duration, fps, start_time):
+        """Print export wall time and throughput so export paths can be compared."""
+        elapsed = time.perf_counter() - start_time
+        frames = duration * fps
+        print(f"{exporter} export: {frames:.0f} frames in {elapsed:.2f}s ({frames / max(elapsed, 1e-9):.1f} fps)")
@@ -1,91 +1,341 @@
 import logging
-from moviepy.editor import CompositeVideoClip
+from moviepy.editor import CompositeVideoClip, concatenate_videoclips
 from background_animator import BackgroundAnimator
-from text_overlay import TextOverlay
+from text_overlay import TextOverlay, CUE_STORE
+from overlay_renderer import OverlayRenderer
 from subtitle_parser import SubtitleParser
 from video_exporter import VideoExporter
 from audio_handler import AudioHandler
+from asset_store import AssetStore
+from job_manifest import STYLE_PRESETS, FADE_BASE_FPS
 import os
 
 
 class VideoGenerator:
-    def __init__(self, font_path, logger=None):
-        """Initialize the video generator with font path and an optional logger."""
+    def __init__(self, font_path, logger=None, style=None):
+        """Initialize the video generator with font path, an optional logger and a text style.
+
+        `style` holds TextOverlay options (see job_manifest.STYLE_PRESETS) and defaults to
+        the 'default' preset.
+        """
         self.font_path = font_path
         self.logger = logger or logging.getLogger(__name__)  # Default to root logger if no logger is provided
+        self.style = style or STYLE_PRESETS['default']
 
-    def create_video(self, video_number, input_dir, output_dir, config):
-        """Create video synchronized with audio duration and update done.txt file."""
-        try:
-            # Construct file paths
-            background_path = os.path.join(input_dir, f"{video_number}.png")
-            subtitle_path = os.path.join(input_dir, f"{video_number}.srt")
-
-            # Look for either mp3 or wav audio file
-            audio_path = None
-            for ext in ['.mp3', '.wav']:
-                temp_path = os.path.join(input_dir, f"{video_number}{ext}")
-                if os.path.exists(temp_path):
-                    audio_path = temp_path
-                    break
+    @staticmethod
+    def resolve_input_paths(video_number, input_dir):
+        """Return (background_path, subtitle_path, audio_path) for a video number.
 
-            output_path = os.path.join(output_dir, f"output_{video_number}.mp4")
+        audio_path is None when neither an mp3 nor a wav file exists.
+        """
+        background_path = os.path.join(input_dir, f"{video_number}.png")
+        subtitle_path = os.path.join(input_dir, f"{video_number}.srt")
 
-            # Verify files exist
-            if not os.path.exists(background_path):
-                raise FileNotFoundError(f"Background image not found: {background_path}")
-            if not os.path.exists(subtitle_path):
-                raise FileNotFoundError(f"Subtitle file not found: {subtitle_path}")
-            if not audio_path:
-                raise FileNotFoundError(f"Audio file not found for video {video_number}")
+        # Look for either mp3 or wav audio file
+        audio_path = None
+        for ext in ['.mp3', '.wav']:
+            temp_path = os.path.join(input_dir, f"{video_number}{ext}")
+            if os.path.exists(temp_path):
+                audio_path = temp_path
+                break
 
-            # Log the start of video generation
-            self.logger.info(f"Generating video {video_number}...")
+        return background_path, subtitle_path, audio_path
 
-            # Load audio and get duration
-            audio_clip, audio_duration = AudioHandler.load_audio(audio_path)
-
-            # Initialize components
-            background_animator = BackgroundAnimator(background_path, res_x=config.res_x, res_y=config.res_y)
-            text_overlay = TextOverlay(
-                self.font_path,
-                font_size=160,  # Initial size; dynamic adjustment will follow
-                shadow_spread=5,  # Higher spread for high-res text
-                shadow_opacity=0.9,
-                shadow_color=(255, 255, 255),
-                shadow_offset=(0, 0),  # Adjusted for high resolution
-                resolution_scale=1  # High resolution scale for crisp text
-            )
+    @staticmethod
+    def job_input_paths(video_number, input_dir, job=None):
+        """Return a video's input paths from its manifest `job`, or by the N.png/N.srt convention."""
+        if job is not None:
+            return job.input_paths()
+        return VideoGenerator.resolve_input_paths(video_number, input_dir)
 
-            # Generate animated background matching audio duration
-            background_clip = background_animator.animate_background(audio_duration)
+    @staticmethod
+    def job_output_path(video_number, output_dir, variant='final', job=None):
+        """Return a video's output path from its manifest `job`, or in `output_dir`."""
+        if job is not None:
+            return job.output_path(variant)
+        return VideoGenerator.output_path_for(video_number, output_dir, variant)
 
-            # Parse subtitles
-            subtitles = SubtitleParser.parse_subtitle_file(subtitle_path)
+    @staticmethod
+    def output_path_for(video_number, output_dir, variant='final'):
+        """Return the output path for a video number; previews (see Config.output_variant) get their own file."""
+        if variant != 'final':
+            return os.path.join(output_dir, f"output_{video_number}.{variant}.mp4")
+        return os.path.join(output_dir, f"output_{video_number}.mp4")
+
+    @staticmethod
+    def segment_path_for(video_number, output_dir, segment_index):
+        """Return the path of one time segment of a sharded render."""
+        return os.path.join(output_dir, f"output_{video_number}.seg{segment_index:03d}.mp4")
+
+    @staticmethod
+    def _verify_inputs(video_number, background_path, subtitle_path, audio_path):
+        """Raise FileNotFoundError if any input file of a video is missing."""
+        if not os.path.exists(background_path):
+            raise FileNotFoundError(f"Background image not found: {background_path}")
+        if not os.path.exists(subtitle_path):
+            raise FileNotFoundError(f"Subtitle file not found: {subtitle_path}")
+        if not audio_path:
+            raise FileNotFoundError(f"Audio file not found for video {video_number}")
+
+    @staticmethod
+    def fade_frames_for(style, fps):
+        """Frames per subtitle fade at `fps`, keeping the duration the style defines at FADE_BASE_FPS."""
+        return max(1, round((style or STYLE_PRESETS['default']).get('fade_frames', 12) * fps / FADE_BASE_FPS))
+
+    def _create_text_overlay(self, config):
+        """Create the TextOverlay with the lyric video text style at `config`'s quality."""
+        return TextOverlay(
+            self.font_path,
+            **dict(self.style, fade_frames=self.fade_frames_for(self.style, config.fps)),
+            size_scale=config.text_scale,
+            resample=config.text_resample,
+            shadow_blur=config.shadow_blur,
+            cue_store=self.cue_store_for(config),
+            glyph_cache_bytes=config.glyph_cache_mb * 1024 * 1024
+        )
+
+    @staticmethod
+    def cue_store_for(config):
+        """Return the worker's cue animation store sized for `config`, or None when it is disabled."""
+        if not config.cue_store_mb:
+            return None
+        CUE_STORE.resize(config.cue_store_mb * 1024 * 1024)
+        return CUE_STORE
+
+    @staticmethod
+    def asset_store_for(output_dir, config):
+        """Return the shared asset store for a batch, or None when shared assets are disabled."""
+        if not config.shared_assets:
+            return None
+        return AssetStore.for_directory(os.path.join(output_dir, '.asset_cache'))
+
+    def _build_clip(self, background_path, timeline, duration, config, start=0.0, end=None, asset_store=None):
+        """Build the silent background and subtitle clip, cut to [start, end) when given.
 
-            # Create text clips for each subtitle
+        `timeline` is the SubtitleTimeline returned by `load_subtitles`.
+        """
+        # Initialize components
+        background_animator = BackgroundAnimator(background_path, res_x=config.res_x, res_y=config.res_y,
+                                                 asset_store=asset_store)
+        text_overlay = self._create_text_overlay(config)
+
+        # Generate animated background matching audio duration
+        background_clip = background_animator.animate_background(
+            duration,
+            cache_steps=config.background_cache_steps,
+            engine=config.background_engine,
+            motion=config.background_motion,
+            resample=config.background_resample
+        )
+
+        if config.overlay_mode == 'lazy':
+            # Draw the active subtitle straight into each background frame
+            overlay_renderer = OverlayRenderer(text_overlay, timeline)
+            clip = background_clip.fl(overlay_renderer.apply)
+        else:
+            # Create text clips only for subtitles visible in the requested range
+            end_time = duration if end is None else end
             text_clips = [
                 text_overlay.create_text_clip(
                     text=text,
-                    start=start,
-                    duration=duration,
+                    start=cue_start,
+                    duration=cue_duration,
                     fps=config.fps
                 )
-                for start, duration, text in subtitles
+                for cue_start, cue_duration, text in timeline.to_subtitles()
+                if cue_start < end_time and cue_start + cue_duration > start
             ]
 
-            # Combine all clips with audio
-            final_clip = CompositeVideoClip(
+            clip = CompositeVideoClip(
                 [background_clip] + text_clips,
                 # size=background_clip.size
                 size=(config.res_x, config.res_y)
-            ).set_audio(audio_clip)
+            )
+
+        if start or end is not None:
+            clip = clip.subclip(start, end)
+        return clip
+
+    @staticmethod
+    def plan_segments(subtitles, duration, segment_count, fps, min_segment_duration=10.0):
+        """Split a timeline into up to `segment_count` (start, end) ranges.
+
+        Cut points are aligned to frame boundaries and moved to the nearest gap
+        between subtitles (or failing that, a subtitle start) so that no segment
+        starts in the middle of a cue animation.
+        """
+        segment_count = max(1, min(segment_count, int(duration // min_segment_duration)))
+        if segment_count == 1:
+            return [(0.0, duration)]
+
+        cues = sorted((start, start + length) for start, length, _ in subtitles)
+        gaps = [(cues[i][1] + cues[i + 1][0]) / 2 for i in range(len(cues) - 1) if cues[i][1] <= cues[i + 1][0]]
+        cue_starts = [start for start, _ in cues]
+        window = duration / segment_count / 2
+
+        cuts = [0.0]
+        for i in range(1, segment_count):
+            target = duration * i / segment_count
+            cut = target
+            for candidates in (gaps, cue_starts):
+                nearby = [c for c in candidates if abs(c - target) <= window]
+                if nearby:
+                    cut = min(nearby, key=lambda c: abs(c - target))
+                    break
+
+            cut = round(cut * fps) / fps
+            if cuts[-1] < cut < duration:
+                cuts.append(cut)
+        cuts.append(duration)
+
+        return list(zip(cuts[:-1], cuts[1:]))
+
+    @staticmethod
+    def preview_ranges(timeline, cue_numbers, duration, padding=1.0):
+        """Return the merged (start, end) ranges around the cues with the given SRT indices.
+
+        Each cue is widened by `padding` seconds on both sides and clipped to the song.
+        """
+        ranges = []
+        for number in sorted(set(cue_numbers)):
+            index = timeline.cue_numbered(number)
+            if index is None:
+                raise ValueError(f"Cue {number} does not exist or was dropped while normalizing the subtitles")
+            start, end = timeline.starts[index] / timeline.fps, timeline.ends[index] / timeline.fps
+            ranges.append((max(0.0, start - padding), min(duration, end + padding)))
+
+        ranges.sort()
+        merged = [ranges[0]]
+        for start, end in ranges[1:]:
+            if start <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+            else:
+                merged.append((start, end))
+        return merged
+
+    def render_segment(self, video_number, input_dir, output_dir, config, segment_index, start, end, job=None):
+        """Render the silent time range [start, end) of a video to its own segment file."""
+        try:
+            background_path, subtitle_path, audio_path = self.job_input_paths(video_number, input_dir, job)
+            self._verify_inputs(video_number, background_path, subtitle_path, audio_path)
+            segment_path = self.segment_path_for(video_number, output_dir, segment_index)
+
+            self.logger.info(f"Generating video {video_number} segment {segment_index} ({start:.2f}s - {end:.2f}s)...")
+
+            audio_duration = AudioHandler.get_duration(audio_path)
+            timeline = self.load_subtitles(subtitle_path, output_dir, config, self.logger, self.style)
+            segment_clip = self._build_clip(background_path, timeline, audio_duration, config, start, end,
+                                            self.asset_store_for(output_dir, config))
+
+            VideoExporter.export_video(segment_clip, segment_path, config)
+            return segment_path
+
+        except Exception as e:
+            self.logger.error(f"Error generating video {video_number} segment {segment_index}: {str(e)}")
+            raise
+
+    def finalize_segments(self, video_number, input_dir, output_dir, segment_paths, config, job=None):
+        """Losslessly join rendered segments and mux the audio once into the final output."""
+        _, _, audio_path = self.job_input_paths(video_number, input_dir, job)
+        output_path = self.job_output_path(video_number, output_dir, config.output_variant, job)
+        partial_path = f"{os.path.splitext(output_path)[0]}.partial.mp4"
+
+        try:
+            if config.audio_mode == 'mux':
+                muxable_audio_path = AudioHandler.prepare_audio(audio_path, self.audio_cache_dir(output_dir))
+                VideoExporter.concat_segments(segment_paths, partial_path, muxable_audio_path, audio_codec='copy')
+            else:
+                VideoExporter.concat_segments(segment_paths, partial_path, audio_path)
+            os.replace(partial_path, output_path)
+            self.logger.info(f"Successfully generated video {video_number}: {output_path}")
+            return output_path
+        finally:
+            for path in segment_paths + [partial_path]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    @staticmethod
+    def load_subtitles(subtitle_path, output_dir, config, logger=None, style=None):
+        """Return the sorted, frame-quantized and overlap-free SubtitleTimeline of an SRT file.
+
+        Cues are lengthened to fit `style`'s fade in and out. The compiled timeline is
+        cached in the output directory by the SRT's content hash.
+        """
+        fade_frames = VideoGenerator.fade_frames_for(style, config.fps)
+        timeline = SubtitleParser.load_timeline(subtitle_path, config.fps, 2 * fade_frames,
+                                                cache_dir=os.path.join(output_dir, '.subtitle_cache'))
+        if logger and timeline.issues:
+            logger.warning(f"Normalized {subtitle_path}: " + "; ".join(timeline.issues))
+        return timeline
+
+    @staticmethod
+    def audio_cache_dir(output_dir):
+        """Directory holding audio transcoded once for muxing, keyed by content hash."""
+        return os.path.join(output_dir, '.audio_cache')
+
+    def create_video(self, video_number, input_dir, output_dir, config, job=None):
+        """Create video synchronized with audio duration and update done.txt file.
+
+        With a manifest `job`, its input and output paths are used instead of the
+        N.png/N.srt naming convention; `output_dir` then only holds caches.
+        """
+        partial_path = None
+        video_path = None
+        try:
+            # Construct file paths
+            background_path, subtitle_path, audio_path = self.job_input_paths(video_number, input_dir, job)
+            output_path = self.job_output_path(video_number, output_dir, config.output_variant, job)
+            os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+
+            # Render to a partial file first so an interrupted export never looks finished
+            partial_path = f"{os.path.splitext(output_path)[0]}.partial.mp4"
+
+            # Verify files exist
+            self._verify_inputs(video_number, background_path, subtitle_path, audio_path)
+
+            # Log the start of video generation
+            self.logger.info(f"Generating video {video_number}...")
+
+            # Load audio and get duration; muxed audio is only probed, never decoded here
+            if config.audio_mode == 'mux':
+                audio_clip, audio_duration = None, AudioHandler.get_duration(audio_path)
+            else:
+                audio_clip, audio_duration = AudioHandler.load_audio(audio_path)
+
+            # Parse subtitles
+            timeline = self.load_subtitles(subtitle_path, output_dir, config, self.logger, self.style)
+
+            # Combine background and subtitles with audio
+            final_clip = self._build_clip(background_path, timeline, audio_duration, config,
+                                          asset_store=self.asset_store_for(output_dir, config))
+            if audio_clip is not None:
+                final_clip = final_clip.set_audio(audio_clip)
+
+            # Cue previews keep only the time around the selected cues, audio included
+            audio_ranges = None
+            if config.preview_cues:
+                audio_ranges = self.preview_ranges(timeline, config.preview_cues, audio_duration,
+                                                   config.preview_padding)
+                final_clip = concatenate_videoclips([final_clip.subclip(start, end)
+                                                     for start, end in audio_ranges])
+                self.logger.info(f"Rendering cues {config.preview_cues} of video {video_number}: {audio_ranges}")
 
             # Export the final video
-            VideoExporter.export_video(final_clip, output_path, config)
+            if config.audio_mode == 'mux':
+                # Render silent frames, then add the prepared audio in a separate stream-copy step
+                video_path = f"{os.path.splitext(output_path)[0]}.video.mp4"
+                VideoExporter.export_video(final_clip, video_path, config)
+                muxable_audio_path = AudioHandler.prepare_audio(audio_path, self.audio_cache_dir(output_dir))
+                VideoExporter.mux_audio(video_path, muxable_audio_path, partial_path, audio_ranges)
+                os.remove(video_path)
+            else:
+                VideoExporter.export_video(final_clip, partial_path, config, audio_path=audio_path,
+                                           audio_ranges=audio_ranges)
+            os.replace(partial_path, output_path)
 
             # Clean up
-            audio_clip.close()
+            if audio_clip is not None:
+                audio_clip.close()
 
             # Log successful completion
             self.logger.info(f"Successfully generated video {video_number}: {output_path}")
@@ -98,6 +348,9 @@ class VideoGenerator:
         except Exception as e:
             # Log any error that occurs during the video generation process
             self.logger.error(f"Error generating video {video_number}: {str(e)}")
+            for path in (partial_path, video_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
 
             # Update done.txt with failure status
             # self._update_done_file(done_file_path, video_number, status="failed")